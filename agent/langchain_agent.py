@@ -14,16 +14,18 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 import os
 import re
+import asyncio
 import logging
-from typing import List, Dict
+import time
+from typing import Dict, Iterator, List, Tuple
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient, models
-from services.embedder import get_embedding  
-from services.mongo_store import db
-from openai import OpenAI 
-from services.bedrock_client import BedrockLLM
-
-# Choose your Bedrock model, e.g., 'anthropic.claude-v2' or 'ai21.j2-large'
+from services.embedder import get_embedding, get_embedding_async
+from services.vector_store import fused_scores, search_chunks, search_chunks_async
+from services.reranker import RERANK_CANDIDATES, RERANK_ENABLED, rerank
+from services.answer_cache import get_answer_cache
+from services.context_builder import format_context, select_context
+from services.company_resolver import get_company_resolver
+from services.llm_providers import get_llm_provider
 
 # -------------------------------
 # CONFIGURATION
@@ -31,15 +33,15 @@ from services.bedrock_client import BedrockLLM
 
 load_dotenv()
 
-QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
-COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "financial_chunks")
-
-client = QdrantClient(url=QDRANT_URL)
 logger = logging.getLogger(__name__)
 
-# ✅ Initialize OpenAI client (reads OPENAI_API_KEY from env)
-llm = OpenAI()
-# llm = BedrockLLM(model_id="anthropic.claude-v2")
+# LLM_PROVIDER picks OpenAI (default, gpt-4o-mini) or Bedrock; see services/llm_providers.py
+
+# Async pipeline: at most LLM_MAX_CONCURRENCY completions in flight per process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+_llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
 
 # -------------------------------
 # COMPANY EXTRACTION
@@ -47,22 +49,15 @@ llm = OpenAI()
 
 def extract_company_name(query: str) -> str:
     """
-    Extracts company name from query by matching known names in MongoDB.
-    Falls back to 'Reliance Industries Limited' if 'reliance' is in query.
+    Extracts company name from query by matching known names and aliases
+    (see services/company_resolver.py); the most specific mention wins.
     """
-    query_lower = query.lower()
     try:
-        known_companies = [
-            doc["CompanyName"] for doc in db["companies"].find({}, {"CompanyName": 1})
-        ]
-        for name in known_companies:
-            if name.lower() in query_lower:
-                return name
+        company = get_company_resolver().best(query)
+        if company:
+            return company
     except Exception as e:
-        logger.warning(f"MongoDB company lookup failed: {e}")
-
-    if "reliance" in query_lower:
-        return "Reliance Industries Limited"
+        logger.warning(f"Company resolution failed: {e}")
     return "Unknown"
 
 # -------------------------------
@@ -76,132 +71,272 @@ def get_company_docs(company_name: str, query: str, limit: int = 5) -> List[Dict
     try:
         query_vector = get_embedding(query)
 
-        # ✅ Use updated `query_points` API (not `query_vector`)
-        search_results = client.query_points(
-            collection_name=COLLECTION_NAME,
-            query=query_vector,
-            limit=limit,
-            with_payload=True,
-            query_filter=models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="CompanyName",
-                        match=models.MatchValue(value=company_name)
-                    )
-                ]
-            ),
-        )
+        # Dense or hybrid (dense + BM25, RRF-fused) depending on RETRIEVAL_MODE
+        search_results = search_chunks(query, query_vector, company_name, limit=limit)
+        return _to_docs(search_results, fused_scores())
 
-        docs = []
-        for r in search_results.points:
-            payload = r.payload or {}
-            docs.append({
-                "text": payload.get("page_content") or payload.get("text", ""),
-                "score": r.score,
-                "type": payload.get("type", "unknown"),
-                "source": payload.get("source", "unknown"),
-                "page": payload.get("page", 0),
-            })
-        return docs
+    except Exception as e:
+        logger.error(f"Qdrant retrieval error: {e}")
+        return []
 
+
+async def get_company_docs_async(company_name: str, query: str, query_vector, limit: int = 5) -> List[Dict]:
+    """
+    get_company_docs on the async Qdrant client, for an already-computed query vector.
+    """
+    try:
+        results = await search_chunks_async(query, query_vector, company_name, limit=limit)
+        # sparse_enabled() was already resolved by the search request itself
+        return _to_docs(results, fused_scores())
     except Exception as e:
         logger.error(f"Qdrant retrieval error: {e}")
         return []
 
+
+def _to_docs(search_results, fused: bool = False) -> List[Dict]:
+    docs = []
+    for r in search_results:
+        payload = r.payload or {}
+        docs.append({
+            "id": str(r.id),
+            "text": payload.get("page_content") or payload.get("text", ""),
+            "score": r.score,
+            # RRF scores rank, they do not measure similarity; context_builder skips its elbow cut for them
+            "score_type": "rrf" if fused else "cosine",
+            "type": payload.get("type", "unknown"),
+            "source": payload.get("source", "unknown"),
+            "page": payload.get("page", 0),
+        })
+    return docs
+
 # -------------------------------
 # LLM SYNTHESIS
 # -------------------------------
 
-# def synthesize_answer(query: str, docs: List[Dict]) -> str:
-#     if not docs:
-#         return "I couldn’t find any relevant information for your query."
+NO_CONTEXT_ANSWER = "I couldn’t find any relevant information for your query."
+ERROR_ANSWER = "Error generating response."
 
-#     context = "\n\n".join([f"[{d['type']}] {d['text']}" for d in docs])
 
-#     prompt = f"""
-#         You are a financial analysis assistant.
-#         Use the following context from company documents (ADE extraction + Annual Reports)
-#         to answer the user query truthfully and concisely.
+def _chat_messages(query: str, docs: List[Dict]) -> List[Dict]:
+    # docs come from select_context: relevance order, deduplicated, within the token budget
+    context = format_context(docs)
 
-#         User Query: {query}
+    prompt = f"""
+You are a financial analysis assistant.
+Use the following context from company documents (ADE extraction + Annual Reports)
+to answer the user query truthfully and concisely.
 
-#         Context:
-#         {context}
+User Query: {query}
 
-#         If the answer cannot be determined from the context, say so clearly.
-#         Provide numbers and years exactly as in the context.
-#         """ 
+Context:
+{context}
 
-#     try:
-#         # return llm.generate(prompt=prompt, temperature=0.2, max_tokens=512)
-#         # openai response
-#         response = llm.generate(prompt=prompt, temperature=0.2, max_tokens=512)
-#     except Exception as e:
-#         logger.error(f"Bedrock LLM error: {e}")
-#         return "Error generating response."
+If the answer cannot be determined from the context, say so clearly.
+Provide numbers and years exactly as in the context, citing the [n] of the chunks you used.
+"""
+    return [
+        {"role": "system", "content": "You are a helpful financial RAG assistant."},
+        {"role": "user", "content": prompt},
+    ]
 
 
 def synthesize_answer(query: str, docs: List[Dict]) -> str:
     """
-    Synthesizes an answer using retrieved document chunks and OpenAI GPT model.
+    Synthesizes an answer using retrieved document chunks and the configured LLM provider.
     """
     if not docs:
-        return "I couldn’t find any relevant information for your query."
+        return NO_CONTEXT_ANSWER
 
-    context = "\n\n".join([f"[{d['type']}] {d['text']}" for d in docs])
+    try:
+        return get_llm_provider().complete(_chat_messages(query, docs), temperature=0.2)
 
-    prompt = f"""
-You are a financial analysis assistant.
-Use the following context from company documents (ADE extraction + Annual Reports)
-to answer the user query truthfully and concisely.
+    except Exception as e:
+        logger.error(f"LLM synthesis error: {e}")
+        return ERROR_ANSWER
 
-User Query: {query}
 
-Context:
-{context}
+async def synthesize_answer_async(query: str, docs: List[Dict]) -> str:
+    """
+    synthesize_answer without blocking the loop, bounded by the process-wide LLM semaphore.
+    """
+    if not docs:
+        return NO_CONTEXT_ANSWER
 
-If the answer cannot be determined from the context, say so clearly.
-Provide numbers and years exactly as in the context.
-"""
+    try:
+        await asyncio.wait_for(_llm_slots.acquire(), LLM_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.error(f"LLM synthesis error: no free slot within {LLM_QUEUE_TIMEOUT_SECONDS}s")
+        return ERROR_ANSWER
 
     try:
-        # ✅ Use new OpenAI v1 SDK syntax
-        response = llm.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful financial RAG assistant."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.2,
+        return await asyncio.wait_for(
+            get_llm_provider().acomplete(_chat_messages(query, docs), temperature=0.2),
+            LLM_TIMEOUT_SECONDS,
         )
-        return response.choices[0].message.content.strip()
 
     except Exception as e:
-        logger.error(f"LLM synthesis error: {e}")
-        return "Error generating response."
+        logger.error(f"LLM synthesis error: {e!r}")
+        return ERROR_ANSWER
+    finally:
+        _llm_slots.release()
+
+
+def stream_synthesize_answer(query: str, docs: List[Dict]) -> Iterator[str]:
+    """
+    Like synthesize_answer, but yields the answer text piece by piece as the model generates it.
+    """
+    if not docs:
+        yield NO_CONTEXT_ANSWER
+        return
+
+    yield from get_llm_provider().stream(_chat_messages(query, docs), temperature=0.2)
 
 
 # -------------------------------
 # MAIN PIPELINE
 # -------------------------------
 
+def _retrieve(company: str, query: str):
+    """Chunks that go into the prompt, plus stage timings."""
+    if RERANK_ENABLED:
+        # Over-fetch, then keep only the chunks the cross-encoder rates best
+        candidates = get_company_docs(company, query, limit=RERANK_CANDIDATES)
+        docs, timings = rerank(query, candidates)
+    else:
+        docs, timings = get_company_docs(company, query), {}
+    return _select(docs, timings)
+
+
+def _select(docs: List[Dict], timings: Dict):
+    # Score cutoff / elbow, near-duplicate collapse and the prompt token budget
+    docs, context_stats = select_context(docs)
+    timings["context"] = context_stats
+    return docs, timings
+
+
 def answer_financial_query(query: str) -> Dict:
     """
     Full pipeline:
     1️⃣ Identify company
-    2️⃣ Retrieve top chunks
-    3️⃣ Generate LLM answer
+    2️⃣ Retrieve top chunks (optionally over-fetch + cross-encoder rerank)
+    3️⃣ Trim them to the prompt token budget (services/context_builder.py)
+    4️⃣ Generate LLM answer
     """
     company = extract_company_name(query)
-    docs = get_company_docs(company, query)
+
+    # A close-enough earlier question about the same company skips retrieval and the LLM
+    cache = get_answer_cache()
+    query_vector = get_embedding(query) if cache is not None else None
+    if cache is not None:
+        cached = cache.lookup(company, query, query_vector)
+        if cached is not None:
+            return {**cached, "query": query, "cached": True}
+
+    docs, timings = _retrieve(company, query)
     answer = synthesize_answer(query, docs)
 
-    return {
+    result = {
+        "query": query,
+        "company": company,
+        "answer": answer,
+        "sources": docs,
+        "timings": timings,
+    }
+    # Only real answers are worth replaying
+    if cache is not None and docs and answer != ERROR_ANSWER:
+        cache.store(company, query, query_vector, result)
+    return {**result, "cached": False}
+
+
+async def _retrieve_async(company: str, query: str, query_vector):
+    if RERANK_ENABLED:
+        candidates = await get_company_docs_async(company, query, query_vector, limit=RERANK_CANDIDATES)
+        # Cross-encoder inference is CPU work: keep it off the event loop
+        docs, timings = await asyncio.to_thread(rerank, query, candidates)
+    else:
+        docs, timings = await get_company_docs_async(company, query, query_vector), {}
+    # Token counting is CPU work too
+    return await asyncio.to_thread(_select, docs, timings)
+
+
+async def answer_financial_query_async(query: str) -> Dict:
+    """
+    answer_financial_query without blocking the event loop: company
+    resolution and the query embedding run concurrently, Qdrant and OpenAI
+    are awaited on async clients, CPU work runs in threads.
+    """
+    company, query_vector = await asyncio.gather(
+        asyncio.to_thread(extract_company_name, query),
+        get_embedding_async(query),
+    )
+
+    cache = get_answer_cache()
+    if cache is not None:
+        # The lookup may re-read the company's data version from Mongo
+        cached = await asyncio.to_thread(cache.lookup, company, query, query_vector)
+        if cached is not None:
+            return {**cached, "query": query, "cached": True}
+
+    docs, timings = await _retrieve_async(company, query, query_vector)
+    answer = await synthesize_answer_async(query, docs)
+
+    result = {
         "query": query,
         "company": company,
         "answer": answer,
         "sources": docs,
+        "timings": timings,
     }
+    if cache is not None and docs and answer != ERROR_ANSWER:
+        await asyncio.to_thread(cache.store, company, query, query_vector, result)
+    return {**result, "cached": False}
+
+
+def stream_financial_query(query: str) -> Iterator[Tuple[str, Dict]]:
+    """
+    Streaming pipeline, as (event, data) pairs:
+    "sources" as soon as retrieval is done, then one "token" per generated
+    piece of the answer, then "done" with the timings.
+    """
+    started = time.perf_counter()
+    company = extract_company_name(query)
+
+    cache = get_answer_cache()
+    query_vector = get_embedding(query) if cache is not None else None
+    cached = cache.lookup(company, query, query_vector) if cache is not None else None
+    if cached is not None:
+        yield "sources", {"query": query, "company": company, "sources": cached["sources"], "cached": True}
+        yield "token", {"text": cached["answer"]}
+        yield "done", {"cached": True, "timings": {"total_ms": _ms_since(started)}}
+        return
+
+    docs, timings = _retrieve(company, query)
+    timings["retrieval_ms"] = _ms_since(started)
+    yield "sources", {"query": query, "company": company, "sources": docs, "cached": False}
+
+    pieces = []
+    try:
+        for piece in stream_synthesize_answer(query, docs):
+            if not pieces:
+                timings["first_token_ms"] = _ms_since(started)
+            pieces.append(piece)
+            yield "token", {"text": piece}
+    except Exception as e:
+        logger.error(f"LLM streaming error: {e}")
+        yield "error", {"message": ERROR_ANSWER}
+        return
+
+    answer = "".join(pieces).strip()
+    timings["total_ms"] = _ms_since(started)
+    if cache is not None and docs:
+        cache.store(company, query, query_vector, {
+            "query": query, "company": company, "answer": answer, "sources": docs, "timings": timings,
+        })
+    yield "done", {"cached": False, "timings": timings}
+
+
+def _ms_since(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
 
 # -------------------------------
 # Example usage
@@ -1,8 +1,13 @@
 # agent/tools/calc_tool.py
+import logging
 import re
 from decimal import Decimal, getcontext
+from services.fact_store import get_fact_index
+from agent.tools.ratio_engine import panel_available, screen
 getcontext().prec = 12
 
+logger = logging.getLogger(__name__)
+
 NUM_RE = re.compile(r"[-+]?\d[\d,]*\.?\d*")
 import re
 
@@ -15,11 +20,61 @@ def parse_number(value):
     except Exception:
         return 0.0
 
-def compute_ratios(context):
+# Fact-index metrics, most specific first; liabilities stand in for debt when no debt line exists
+DEBT_METRICS = ("total_debt", "total_borrowings", "borrowings", "total_liabilities")
+EQUITY_METRICS = ("total_equity", "total_stockholders_equity", "total_shareholders_equity", "shareholders_equity")
+
+
+def ratio_from_facts(company, numerators, denominators):
+    """
+    (ratio, year, numerator fact, denominator fact) for the latest year that has
+    both, read from the columnar fact index; None if the index lacks either side.
+    """
+    index = get_fact_index()
+    if index is None or not company:
+        return None
+    num = {f["year"]: f for f in index.first_series(company, numerators)}
+    den = {f["year"]: f for f in index.first_series(company, denominators)}
+    for year in sorted(set(num) & set(den), reverse=True):
+        n, d = num[year], den[year]
+        # Amounts in different currencies do not divide
+        if n["unit"] and d["unit"] and n["unit"] != d["unit"]:
+            continue
+        if d["value"]:
+            return (n["value"] * n["scale"]) / (d["value"] * d["scale"]), year, n, d
+    return None
+
+
+def screen_ratios(filters=None, ratios=None, **kwargs):
     """
-    Extracts numeric values (like Total Debt, Total Equity, etc.) from text context
-    and computes basic financial ratios.
+    Screen every ingested company-year at once, e.g.
+    screen_ratios({"roe": {"min": 0.15}, "debt_to_equity": {"max": 1.0}}, sort_by="roe").
+    Available ratios: see agent.tools.ratio_engine.RATIOS.
     """
+    return screen(filters=filters, ratios=ratios, **kwargs)
+
+
+def compute_ratios(context, company=None):
+    """
+    Computes the Debt-to-Equity ratio: from the fact index when the company is
+    known, otherwise from numeric values (Total Debt, Total Equity) in the text context.
+    """
+    found = ratio_from_facts(company, DEBT_METRICS, EQUITY_METRICS)
+    if found is not None:
+        ratio, year, debt, equity = found
+        return f"Estimated Debt-to-Equity ratio: {ratio:.2f} ({debt['metric']} / {equity['metric']}, {debt['period']})"
+
+    # Structured schema extractions, via the portfolio ratio panel (skipped for a while after it failed to load)
+    if company and panel_available():
+        try:
+            screened = screen(ratios=["debt_to_equity"], companies=[company], latest_only=True)["results"]
+        except Exception as e:
+            logger.warning(f"Ratio panel unavailable, falling back to the text context: {e}")
+            screened = []
+        if screened and screened[0]["debt_to_equity"] is not None:
+            row = screened[0]
+            return f"Estimated Debt-to-Equity ratio: {row['debt_to_equity']:.2f} (total_liabilities / total_equity, {row['period']})"
+
     # If input is dict, extract text
     if isinstance(context, dict):
         text = context.get("text", "")
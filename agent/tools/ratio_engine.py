@@ -0,0 +1,258 @@
+# agent/tools/ratio_engine.py
+"""
+Vectorized ratio screening
+--------------------------
+Loads the structured schema extractions for every company and year into a
+panel of NumPy arrays (one float64 column per financial field, NaN where
+a field is missing) and computes a library of ratios over all rows at
+once, so screening the whole portfolio is a handful of array operations
+instead of one LLM-driven query per company.
+
+Sources, newest document per (company, fiscal year) wins:
+    financial_schemas       save_schema_document (latest per company)
+    ade_extracted_fields    every schema extraction ingested (history)
+
+Values like "10,71,174 crore" are parsed to absolute amounts. Any ratio
+with a missing or zero denominator is NaN, and NaN never passes a filter.
+Growth rates compare a company's row with its own previous fiscal year.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from services.fact_extractor import extraction_period, parse_field_value
+from services.lru_cache import TTLCache
+from services.mongo_store import get_db, normalize_company_name
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+RATIO_PANEL_TTL = float(os.getenv("RATIO_PANEL_TTL", "300"))
+# After a failed load, panel_available() is False this long
+RATIO_PANEL_RETRY_SECONDS = float(os.getenv("RATIO_PANEL_RETRY_SECONDS", "60"))
+
+# Panel field -> schema paths, first non-empty wins (statement lines before highlights)
+FIELDS = {
+    "revenue": ("income_statement.revenue", "financial_highlights.total_revenue"),
+    "cost_of_goods_sold": ("income_statement.cost_of_goods_sold",),
+    "gross_profit": ("income_statement.gross_profit",),
+    "operating_income": ("income_statement.operating_income", "financial_highlights.operating_profit"),
+    "interest_expense": ("income_statement.interest_expense",),
+    "net_income": ("income_statement.net_income", "financial_highlights.net_income"),
+    "current_assets": ("balance_sheet.assets.current_assets",),
+    "total_assets": ("balance_sheet.assets.total_assets", "financial_highlights.total_assets"),
+    "current_liabilities": ("balance_sheet.liabilities.current_liabilities",),
+    "total_liabilities": ("balance_sheet.liabilities.total_liabilities", "financial_highlights.total_liabilities"),
+    "total_equity": ("balance_sheet.equity.total_equity", "financial_highlights.shareholders_equity"),
+    "operating_cash_flow": ("cash_flow_statement.operating_cash_flow",),
+}
+
+
+def _div(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = a / b
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def _growth(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    return _div(current - previous, np.abs(previous))
+
+
+# Ratio name -> f(panel) over every row. The schema has no debt line, so D/E is liabilities-based.
+RATIOS: Dict[str, Callable[["FinancialPanel"], np.ndarray]] = {
+    "debt_to_equity": lambda p: _div(p["total_liabilities"], p["total_equity"]),
+    "current_ratio": lambda p: _div(p["current_assets"], p["current_liabilities"]),
+    "gross_margin": lambda p: _div(
+        np.where(np.isnan(p["gross_profit"]), p["revenue"] - p["cost_of_goods_sold"], p["gross_profit"]), p["revenue"]
+    ),
+    "operating_margin": lambda p: _div(p["operating_income"], p["revenue"]),
+    "net_margin": lambda p: _div(p["net_income"], p["revenue"]),
+    "roe": lambda p: _div(p["net_income"], p["total_equity"]),
+    "roa": lambda p: _div(p["net_income"], p["total_assets"]),
+    "interest_coverage": lambda p: _div(p["operating_income"], p["interest_expense"]),
+    "operating_cash_flow_margin": lambda p: _div(p["operating_cash_flow"], p["revenue"]),
+    "revenue_growth": lambda p: _growth(p["revenue"], p.previous("revenue")),
+    "net_income_growth": lambda p: _growth(p["net_income"], p.previous("net_income")),
+}
+
+
+def _lookup(doc: dict, path: str):
+    for key in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def record_from_schema(doc: dict) -> Optional[dict]:
+    """One panel row (company, year, absolute field amounts) from a schema extraction; None if unusable."""
+    fields = doc.get("extraction") if isinstance(doc.get("extraction"), dict) else doc
+    company = fields.get("company_name")
+    period = extraction_period(fields)
+    if not company or period is None:
+        return None
+    record = {"company": company, "company_key": normalize_company_name(company), "period": period[0],
+              "year": period[1], "created_at": doc.get("created_at")}
+    for name, paths in FIELDS.items():
+        record[name] = np.nan
+        for path in paths:
+            parsed = parse_field_value(_lookup(fields, path))
+            if parsed is not None and not parsed[1]:
+                record[name] = parsed[0] * parsed[2]
+                break
+    return record
+
+
+class FinancialPanel:
+    """Company-year rows sorted by (company, year); one float64 array per field."""
+
+    def __init__(self, records: List[dict]):
+        # Newest document per (company, fiscal year)
+        latest = {}
+        for r in sorted(records, key=lambda r: (r["created_at"] is not None, r["created_at"] or 0)):
+            latest[(r["company_key"], r["year"])] = r
+        rows = sorted(latest.values(), key=lambda r: (r["company_key"], r["year"]))
+
+        self.company_keys = np.array([r["company_key"] for r in rows], dtype=str)
+        self.companies = np.array([r["company"] for r in rows], dtype=str)
+        self.periods = np.array([r["period"] for r in rows], dtype=str)
+        self.years = np.array([r["year"] for r in rows], dtype=np.int32)
+        self.fields = {name: np.array([r[name] for r in rows], dtype=np.float64) for name in FIELDS}
+
+        # Row i's previous fiscal year is row i-1 when it is the same company, one year earlier
+        self._has_previous = np.zeros(len(rows), dtype=bool)
+        if len(rows) > 1:
+            self._has_previous[1:] = (self.company_keys[1:] == self.company_keys[:-1]) & (self.years[1:] == self.years[:-1] + 1)
+        # Latest year per company: the last row of each company run
+        self.is_latest = np.ones(len(rows), dtype=bool)
+        if len(rows) > 1:
+            self.is_latest[:-1] = self.company_keys[:-1] != self.company_keys[1:]
+        self._ratios: Dict[str, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.years)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+
+    def previous(self, field: str) -> np.ndarray:
+        values = self.fields[field]
+        shifted = np.full_like(values, np.nan)
+        shifted[1:] = values[:-1]
+        return np.where(self._has_previous, shifted, np.nan)
+
+    def ratio(self, name: str) -> np.ndarray:
+        if name not in RATIOS:
+            raise ValueError(f"Unknown ratio {name!r}; available: {sorted(RATIOS)}")
+        if name not in self._ratios:
+            self._ratios[name] = RATIOS[name](self)
+        return self._ratios[name]
+
+    def screen(
+        self,
+        ratios: Optional[Iterable[str]] = None,
+        filters: Optional[Dict[str, Dict[str, float]]] = None,
+        companies: Optional[Iterable[str]] = None,
+        years: Optional[Iterable[int]] = None,
+        latest_only: bool = False,
+        sort_by: Optional[str] = None,
+        descending: bool = True,
+        limit: int = 100,
+    ) -> dict:
+        """
+        Company-years passing every filter ({"roe": {"min": 0.15}, "debt_to_equity": {"max": 1}}),
+        with the requested ratios, sorted by `sort_by` (NaN last).
+        """
+        started = time.perf_counter()
+        filters = filters or {}
+        names = list(dict.fromkeys((list(RATIOS) if ratios is None else list(ratios)) + list(filters) + ([sort_by] if sort_by else [])))
+        values = {name: self.ratio(name) for name in names}
+
+        mask = np.ones(len(self), dtype=bool)
+        if latest_only:
+            mask &= self.is_latest
+        if companies:
+            mask &= np.isin(self.company_keys, [normalize_company_name(c) for c in companies])
+        if years:
+            mask &= np.isin(self.years, list(years))
+        for name, bounds in filters.items():
+            # Comparisons with NaN are False, so missing data never passes a filter
+            if bounds.get("min") is not None:
+                mask &= values[name] >= bounds["min"]
+            if bounds.get("max") is not None:
+                mask &= values[name] <= bounds["max"]
+
+        rows = np.flatnonzero(mask)
+        if sort_by:
+            keys = values[sort_by][rows]
+            order = np.argsort(np.where(np.isnan(keys), np.inf, -keys if descending else keys), kind="stable")
+            rows = rows[order]
+        matched = len(rows)
+        rows = rows[:limit]
+
+        results = []
+        for i in rows.tolist():
+            result = {"company": str(self.companies[i]), "period": str(self.periods[i]), "year": int(self.years[i])}
+            for name in names:
+                v = values[name][i]
+                result[name] = None if np.isnan(v) else round(float(v), 4)
+            results.append(result)
+        return {
+            "universe": len(self),
+            "matched": matched,
+            "results": results,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+
+def load_records() -> List[dict]:
+    projection = {"_id": 0, "created_at": 1, "company_name": 1, "fiscal_year": 1, "report_date": 1,
+                  "financial_highlights": 1, "balance_sheet": 1, "income_statement": 1, "cash_flow_statement": 1}
+    db = get_db()
+    docs = list(db["financial_schemas"].find({}, projection))
+    docs += db["ade_extracted_fields"].find(
+        {"extraction.company_name": {"$exists": True}},
+        {"_id": 0, "created_at": 1, **{f"extraction.{k}": 1 for k in projection if k not in ("_id", "created_at")}},
+    )
+    return [r for r in map(record_from_schema, docs) if r is not None]
+
+
+_panel_cache = TTLCache(maxsize=1, ttl=RATIO_PANEL_TTL)
+_panel_lock = threading.Lock()
+_panel_failed_at: Optional[float] = None
+
+
+def get_panel() -> FinancialPanel:
+    """The portfolio panel, rebuilt from Mongo at most every RATIO_PANEL_TTL seconds."""
+    global _panel_failed_at
+    panel = _panel_cache.get("panel")
+    if panel is None:
+        with _panel_lock:
+            panel = _panel_cache.get("panel")
+            if panel is None:
+                started = time.perf_counter()
+                try:
+                    panel = FinancialPanel(load_records())
+                except Exception:
+                    _panel_failed_at = time.monotonic()
+                    raise
+                _panel_failed_at = None
+                _panel_cache.put("panel", panel)
+                logger.info(f"Ratio panel loaded: {len(panel)} company-years in {time.perf_counter() - started:.2f}s.")
+    return panel
+
+
+def panel_available() -> bool:
+    """False for RATIO_PANEL_RETRY_SECONDS after a failed load, so fallbacks skip the panel instead of waiting on Mongo again."""
+    return _panel_failed_at is None or time.monotonic() - _panel_failed_at >= RATIO_PANEL_RETRY_SECONDS
+
+
+def screen(**kwargs) -> dict:
+    return get_panel().screen(**kwargs)
@@ -42,7 +42,7 @@ export default function ChatPage() {
   const [isTyping, setIsTyping] = useState(false);
   const [chartData, setChartData] = useState<any[]>([]);
   const [chartType, setChartType] = useState<string>("bar");
-  const [chartBase64, setChartBase64] = useState<string>("");
+  const [chartSrc, setChartSrc] = useState<string>("");
   const [insight, setInsight] = useState<string>("");
   const [sources, setSources] = useState<any[]>([]);
   const scrollRef = useRef<HTMLDivElement>(null);
@@ -90,11 +90,17 @@ export default function ChatPage() {
       if (vizRes.data?.data?.length > 0) {
         setChartData(vizRes.data.data);
         setChartType(vizRes.data.chart_type || "bar");
-        setChartBase64(vizRes.data.chart_base64 || "");
+        setChartSrc(
+          vizRes.data.chart_url
+            ? `http://localhost:8000${vizRes.data.chart_url}`
+            : vizRes.data.chart_base64
+            ? `data:image/png;base64,${vizRes.data.chart_base64}`
+            : ""
+        );
         setInsight(vizRes.data.insight || "");
       } else {
         setChartData([]);
-        setChartBase64("");
+        setChartSrc("");
         setInsight("No visualizable financial data found.");
       }
     } catch (err) {
@@ -122,11 +128,11 @@ export default function ChatPage() {
   const COLORS = ["#3b82f6", "#10b981", "#f59e0b", "#ef4444", "#8b5cf6"];
 
   const renderChart = () => {
-    if (chartBase64) {
+    if (chartSrc) {
       return (
         <div className="flex justify-center">
           <img
-            src={`data:image/png;base64,${chartBase64}`}
+            src={chartSrc}
             alt="Financial Chart"
             className="rounded-lg shadow-md max-h-[400px]"
           />
@@ -1,11 +1,60 @@
-
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from routers.parse_route import router as parse_router
 from routers.query_route import router as query_router
 from routers.visual_route import router as visual_router
 from fastapi.middleware.cors import CORSMiddleware
+from services import mongo_store, resources, vector_store
+from services.ade_client import close_ade_client
+from services.llm_providers import close_llm_provider
+from services.company_resolver import get_company_resolver
+from services.reranker import RERANK_ENABLED, score as rerank_score
+from services.embedder import get_backend, preload_query_embeddings, start_query_batcher, stop_query_batcher
+
+logger = logging.getLogger(__name__)
+
+# Seconds between warm-up attempts while a backend is unavailable
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "10"))
+
+WARMUP_CHECKS = {
+    "embedder": lambda: get_backend().encode(["warm-up"]),
+    "qdrant": vector_store.ping,
+    "mongo": mongo_store.ping,
+    "canned_questions": preload_query_embeddings,
+    "company_resolver": get_company_resolver().refresh,
+}
+if RERANK_ENABLED:
+    WARMUP_CHECKS["reranker"] = lambda: rerank_score("warm-up", [{"text": "warm-up"}])
+
 
-app = FastAPI(title="Financial AI Agent Backend")
+async def _warm_up_until_ready():
+    # Runs after the server is listening; /health/ready stays 503 until this succeeds
+    while True:
+        try:
+            await asyncio.to_thread(resources.warm_up, WARMUP_CHECKS)
+            return
+        except Exception:
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_query_batcher()
+    warm_up = asyncio.create_task(_warm_up_until_ready())
+    yield
+    warm_up.cancel()
+    await stop_query_batcher()
+    await close_llm_provider()
+    await vector_store.close_async_qdrant_client()
+    await close_ade_client()
+    resources.close_all()
+
+
+app = FastAPI(title="Financial AI Agent Backend", lifespan=lifespan)
 app.include_router(parse_router)
 app.include_router(query_router)
 app.include_router(visual_router)
@@ -23,12 +72,27 @@ def root():
     return {"status":"FastAPI is Running..!"}
 
 @app.get("/health")
+@app.get("/health/live")
 def health_check():
+    """Liveness: the process is up and serving; says nothing about backends."""
     return {"status":"OK"}
 
+@app.get("/health/ready")
+def readiness_check():
+    """Readiness: model loaded and Qdrant / Mongo reachable; 503 until warm-up has passed."""
+    status = resources.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming", **status})
+    return {"status": "ready", **status}
+
 
 @app.post("/load_api_key")
 def load_api_key(api_key: str):
+    """
+    Set VISION_AGENT_API_KEY for this API process only (parse-job submits).
+    The ADE poller and ingest workers are separate processes: they read the
+    key from their own environment / .env at start-up.
+    """
     import os
     os.environ["VISION_AGENT_API_KEY"] = api_key
-    return {"status": "API key loaded successfully."}
\ No newline at end of file
+    return {"status": "API key loaded successfully (API process only; set it in .env for the poller and workers)."}
\ No newline at end of file
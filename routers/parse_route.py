@@ -1,130 +1,103 @@
 # agent_finance/routers/parse_route.py
 
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, HTTPException
 import asyncio
 import json
 import logging
-
-from services.ade_parser import (
-    call_landingai_ade_jobs,
-    Status_landingai_ade_jobs,
-    get_landingai_ade_output,
-    extract_fields_from_ade_output,
+import uuid
+
+from services import doc_cache
+from services.ade_client import call_landingai_ade_jobs
+from services.job_queue import (
+    submit_job,
+    enqueue_job,
+    record_cached_job,
+    find_active_job,
+    get_job,
+    queue_depth,
 )
-from services.preprocessor import preprocess_ade_json
-from services.embedder import embed_chunks
-from services.vector_store import chunk_store
-from services.mongo_store import save_document
+from services.mongo_store import save_document, get_service_stats
+from services.ade_poller import POLLER_STATS_KEY
+from services.embedding_cache import get_embedding_cache
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-# ✅ Background worker for ADE → extract → embed → store
-async def process_ade_job(job_id: str, report_file: UploadFile = None):
-    delay = 5
-    try:
-        while True:
-            status = Status_landingai_ade_jobs(job_id)
-            job_state = status.get("status")
-
-            if job_state == "completed":
-                output_url = status.get("output_url")
-                ade_output = get_landingai_ade_output(output_url)
-                save_document(ade_output, collection="ade_raw_outputs")
-
-                extracted_fields = extract_fields_from_ade_output(ade_output)
-                save_document(extracted_fields, collection="ade_extracted_fields")
-
-                processed_chunks = preprocess_ade_json(ade_output)
-                embedded_ade_chunks = embed_chunks(processed_chunks)
-                chunk_store(embedded_ade_chunks)
-
-                print(f"✅ ADE job {job_id} parsed & stored successfully.")
-
-                # Optional: also handle report_file if provided
-                if report_file:
-                    await process_report_file(report_file, ade_output)
-
-                save_document({"job_id": job_id, "status": "completed"}, collection="ade_jobs")
-                break
-
-            elif job_state in ["processing", "running"]:
-                await asyncio.sleep(delay)
-                delay = min(delay + 3, 30)
-            else:
-                save_document({"job_id": job_id, "status": "failed"}, collection="ade_jobs")
-                print(f"❌ Job {job_id} failed: {status}")
-                break
-
-    except Exception as e:
-        save_document({"job_id": job_id, "status": "error", "error": str(e)}, collection="ade_jobs")
-        print(f"⚠️ Error in background ADE job {job_id}: {e}")
-
-
-# ✅ Helper: Process and store Annual Report file
-async def process_report_file(report_file: UploadFile, ade_output: dict = None):
+# ✅ Helper: Persist the Annual Report JSON so an ingest worker can pick it up later
+async def save_report_file(report_file: UploadFile) -> dict:
     try:
         report_data = json.loads((await report_file.read()).decode("utf-8"))
-        company_name = ade_output.get("extraction", {}).get("company_name", "Unknown") if ade_output else "Unknown"
-        save_document(report_data, collection="annual_reports")
-
-        report_chunks = []
-        for idx, ch in enumerate(report_data.get("chunks", [])):
-            text = ch.get("markdown", "")
-            if not text.strip():
-                continue
-            report_chunks.append({
-                "text": text,
-                "metadata": {
-                    "CompanyName": company_name,
-                    "page": ch.get("grounding", {}).get("page", 0),
-                    "type": ch.get("type", "text"),
-                    "chunk_index": idx,
-                    "source": report_data.get("metadata", {}).get("filename", report_file.filename),
-                },
-            })
-
-        embedded_report = embed_chunks(report_chunks)
-        chunk_store(embedded_report)
-        print(f"✅ Stored {len(embedded_report)} report chunks for {company_name}")
-
-    except Exception as e:
-        print(f"⚠️ Error storing report file: {e}")
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"report_file is not valid JSON: {e}")
+
+    await asyncio.to_thread(save_document, report_data, "annual_reports")
+    return {"report_id": str(report_data["_id"]), "report_filename": report_file.filename}
 
 
 # ✅ Unified endpoint: parse ADE → auto-store ADE & Report
 @router.post("/parse_router")
 async def parse_and_store_documents(
-    background_tasks: BackgroundTasks,
     ade_file: UploadFile = File(...),
     report_file: UploadFile = File(None)
 ):
     """
     Unified endpoint:
+    0️⃣ Skips LandingAI / embedding for files already in the content-addressed cache
     1️⃣ Submits ADE extraction job to LandingAI
-    2️⃣ Tracks completion asynchronously
-    3️⃣ On completion → saves ADE output + embeddings
+    2️⃣ Registers the job in `ade_jobs`; the central poller (python -m services.ade_poller) tracks completion
+    3️⃣ An ingest worker (python -m services.ingest_worker) saves ADE output + embeddings
     4️⃣ Optionally embeds & stores the annual report file
     """
-    # Read ADE input content
-    content = await ade_file.read()
     filename = ade_file.filename
-
-    # Step 1️⃣ — Create ADE Job
-    ade_response = call_landingai_ade_jobs(content, filename)
+    content_hash = await asyncio.to_thread(doc_cache.hash_upload, ade_file.file)
+    job_fields = {"filename": filename, "content_hash": content_hash}
+    if report_file:
+        job_fields.update(await save_report_file(report_file))
+
+    # Step 0️⃣ — Known document? Serve it from the content-addressed cache
+    manifest = await asyncio.to_thread(doc_cache.lookup, content_hash)
+    if manifest:
+        job_id = f"cache-{uuid.uuid4().hex}"
+        job_fields.update(
+            cache_hit=True,
+            cache_path=doc_cache.artifact_dir(content_hash),
+            source_job_id=manifest.get("job_id"),
+        )
+        if manifest.get("ingested") and not report_file:
+            await asyncio.to_thread(record_cached_job, job_id, **job_fields)
+            message = "Document already processed; served from cache without re-parsing or re-embedding."
+        else:
+            await asyncio.to_thread(enqueue_job, job_id, **job_fields)
+            message = "Document already parsed; reusing cached ADE output and skipping LandingAI."
+        return {"status": "started", "job_id": job_id, "cached": True, "message": message}
+
+    # Identical bytes already in flight → share that job instead of parsing twice
+    if not report_file:
+        active = await asyncio.to_thread(find_active_job, content_hash)
+        if active:
+            return {
+                "status": "started",
+                "job_id": active["job_id"],
+                "cached": True,
+                "message": "An identical document is already being processed.",
+            }
+
+    # Step 1️⃣ — Create ADE Job (streams straight from the spooled upload buffer)
+    ade_response = await call_landingai_ade_jobs(ade_file.file, filename)
     job_id = ade_response.get("job_id")
 
     if not job_id:
         raise ValueError(f"ADE job creation failed: {ade_response}")
 
-    # Step 2️⃣ — Run ADE + optional report processing in background
-    background_tasks.add_task(process_ade_job, job_id, report_file)
+    # Step 2️⃣ — Hand ADE + optional report processing to the poller / ingest workers
+    await asyncio.to_thread(submit_job, job_id, **job_fields)
 
     # Step 3️⃣ — Return job info immediately
     return {
         "status": "started",
         "job_id": job_id,
+        "cached": False,
         "message": "ADE job submitted successfully. It will automatically process and store ADE + report data when complete.",
     }
 
@@ -132,8 +105,30 @@ async def parse_and_store_documents(
 @router.get("/status/{job_id}")
 async def get_job_status(job_id: str):
     """Check ADE job processing status."""
-    from services.mongo_store import db
-    job = db["ade_jobs"].find_one({"job_id": job_id})
+    job = await asyncio.to_thread(get_job, job_id)
     if not job:
         return {"job_id": job_id, "status": "unknown"}
-    return {"job_id": job_id, "status": job.get("status", "unknown")}
+    return {
+        "job_id": job_id,
+        "status": job.get("status", "unknown"),
+        "attempts": job.get("attempts", 0),
+        "error": job.get("error"),
+        "cache_path": job.get("cache_path"),
+    }
+
+
+@router.get("/poller_stats")
+async def get_poller_stats():
+    """ADE poller counters (queue depth, poll counts) plus per-state job counts."""
+    poller = await asyncio.to_thread(get_service_stats, POLLER_STATS_KEY)
+    jobs = await asyncio.to_thread(queue_depth)
+    return {"poller": poller, "jobs": jobs}
+
+
+@router.get("/embedding_cache_stats")
+async def get_embedding_cache_stats():
+    """Size and hit rate of the persistent chunk-embedding cache on this host."""
+    cache = get_embedding_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(cache.stats)}
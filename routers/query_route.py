@@ -1,25 +1,116 @@
-from fastapi import APIRouter 
-from agent.langchain_agent import answer_financial_query
+import asyncio
+import json
+from typing import Dict, List, Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from agent.langchain_agent import answer_financial_query_async, extract_company_name, stream_financial_query
 from agent.tools import calc_tool
-from pydantic import BaseModel
+from services.embedder import query_batcher_stats, query_cache_stats
+from services.reranker import rerank_cache_stats
+from services.answer_cache import answer_cache_stats
+from services.fact_store import fact_index_stats
+from pydantic import BaseModel, conint
 
 class QueryRequest(BaseModel):
     query:str
+
+class RatioRequest(BaseModel):
+    query:str
+    company:str = None
+
+class ScreenRequest(BaseModel):
+    ratios: Optional[List[str]] = None  # default: every ratio in ratio_engine.RATIOS
+    filters: Dict[str, Dict[str, float]] = {}  # {"roe": {"min": 0.15}, "debt_to_equity": {"max": 1}}
+    companies: Optional[List[str]] = None
+    years: Optional[List[int]] = None
+    latest_only: bool = True
+    sort_by: Optional[str] = None
+    descending: bool = True
+    limit: conint(ge=0) = 100
     
 router = APIRouter()
 @router.get("/health_query")
 async def health_check():
     return {"status":"Query Router is Healthy"}
 
+@router.get("/query_cache_stats")
+async def get_query_cache_stats():
+    """Hit / miss counts of the query-embedding cache."""
+    return query_cache_stats()
+
+@router.get("/query_batcher_stats")
+async def get_query_batcher_stats():
+    """Micro-batcher batch-size / queue-wait / encode-time histograms."""
+    return query_batcher_stats()
+
+@router.get("/rerank_cache_stats")
+async def get_rerank_cache_stats():
+    """Hit / miss counts of the cross-encoder (query, chunk) score cache."""
+    return rerank_cache_stats()
+
+@router.get("/answer_cache_stats")
+async def get_answer_cache_stats():
+    """Semantic answer cache hit rate and LLM calls saved."""
+    return answer_cache_stats()
+
+@router.get("/fact_index_stats")
+async def get_fact_index_stats():
+    """Companies and facts loaded from the columnar fact index."""
+    return fact_index_stats()
+
 @router.post("/query_router")
 async def query_agent(request:QueryRequest):
     query = request.query
     
-    result = answer_financial_query(query)
+    # Fully async: concurrent queries overlap and share embedding micro-batches
+    result = await answer_financial_query_async(query)
     print("Query Result:", result)
     return{
         "status":"success",
         "query":query,
         "response":result.get('answer'),
-    }    
+        "timings":result.get('timings', {}),
+        "cached":result.get('cached', False),
+    }
+
+def _sse(events):
+    for event, data in events:
+        yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/query_router/stream")
+async def query_agent_stream(request:QueryRequest):
+    """
+    Server-sent events: `sources` once retrieval finishes, `token` per generated
+    piece of the answer, then `done` with timings (or `error`).
+    """
+    # A sync generator: Starlette iterates it in the threadpool, off the event loop
+    return StreamingResponse(
+        _sse(stream_financial_query(request.query)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/ratio_router")
+async def ratio_agent(request:RatioRequest):
+    """Debt-to-equity from the ingested fact index: no retrieval, no LLM call."""
+    company = request.company or await asyncio.to_thread(extract_company_name, request.query)
+    result = await asyncio.to_thread(calc_tool.compute_ratios, request.query, company)
+    return {
+        "status":"success",
+        "query":request.query,
+        "company":company,
+        "response":result,
+    }
 
+@router.post("/ratio_screen")
+async def ratio_screen(request:ScreenRequest):
+    """
+    Screen every ingested company-year on vectorized ratios (D/E, current ratio,
+    margins, ROE/ROA, interest coverage, growth); missing data never passes a filter.
+    """
+    try:
+        # The first call of a panel TTL window reloads it from Mongo
+        result = await asyncio.to_thread(calc_tool.screen_ratios, **request.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status":"success", **result}
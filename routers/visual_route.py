@@ -1,10 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
-import pandas as pd
-import matplotlib.pyplot as plt
-import io, base64, re, json, numpy as np
-from agent.langchain_agent import answer_financial_query
+from typing import TYPE_CHECKING, Optional, Dict, Any, List
+import asyncio, base64, re, json, numpy as np
+from agent.langchain_agent import answer_financial_query_async, extract_company_name
+from services.fact_extractor import SCALES
+from services.fact_store import get_fact_index
+from services.chart_renderer import (
+    CHART_FORMAT, CHART_SPEC_TTL, MEDIA_TYPES, build_spec, chart_renderer_stats, get_chart_renderer,
+)
+
+# pandas is imported on first chart request, not at app start-up; matplotlib only in the render workers
+if TYPE_CHECKING:
+    import pandas as pd
 
 router = APIRouter()
 
@@ -17,6 +24,8 @@ class VisualizationRequest(BaseModel):
     company: Optional[str] = None
     chart_type: Optional[str] = None  # "line", "bar", "pie"
     auto_detect: bool = True
+    image_format: Optional[str] = None  # "png" (default) or "svg"
+    inline_image: bool = False  # also return the chart as base64, besides chart_url
 
 
 # =========================
@@ -36,11 +45,12 @@ def detect_chart_type(query: str) -> str:
 # =========================
 # Numeric Data Extraction
 # =========================
-def extract_data_from_text(text: str) -> pd.DataFrame:
+def extract_data_from_text(text: str) -> "pd.DataFrame":
     """
     Extracts year-value or label-value pairs from RAG output text.
     Uses regex to detect multiple metrics.
     """
+    import pandas as pd
 
     # Try year + numeric extraction (e.g., 2021: 1200)
     pattern = re.findall(r"(\b20\d{2}\b)[^\d]{1,10}(\d{1,3}(?:,\d{3})*(?:\.\d+)?)", text)
@@ -65,6 +75,28 @@ def extract_data_from_text(text: str) -> pd.DataFrame:
     return df
 
 
+def series_from_facts(company: str, query: str):
+    """
+    (DataFrame, summary) for the metric the query names, read from the
+    columnar fact index built at ingest; None when the index has no match.
+    """
+    import pandas as pd
+
+    index = get_fact_index()
+    facts = index.get(company) if index is not None else None
+    metric = facts.match_metric(query) if facts is not None else None
+    series = facts.series(metric) if metric else []
+    if not series:
+        return None
+
+    df = pd.DataFrame({"Year": [f["year"] for f in series], "Value": [f["value"] for f in series]})
+    scale_word = {v: k for k, v in SCALES.items()}.get(series[0]["scale"], "")
+    unit = ", ".join(u for u in (series[0]["unit"], f"{scale_word}s" if scale_word else "") if u)
+    points = "; ".join(f"{f['period']}: {f['value']:,.2f}" for f in series)
+    summary = f"{series[0]['label']}{f' ({unit})' if unit else ''} — {points}"
+    return df, summary
+
+
 # =========================
 # Visualization Endpoint
 # =========================
@@ -72,68 +104,77 @@ def extract_data_from_text(text: str) -> pd.DataFrame:
 async def visualize_router(request: VisualizationRequest):
     try:
         query = request.query
-        company = request.company or "Unknown"
+        company = request.company or await asyncio.to_thread(extract_company_name, query)
         chart_type = request.chart_type or detect_chart_type(query)
 
-        # Step 1️⃣: Retrieve answer using the Financial RAG agent
-        result = answer_financial_query(query)
-        text = result.get("answer", "")
+        # Step 1️⃣: Series straight from the fact index when the query names an ingested metric
+        found = await asyncio.to_thread(series_from_facts, company, query)
+        if found is not None:
+            df, text = found
+            data_source = "fact_index"
+        else:
+            # Otherwise retrieve an answer using the Financial RAG agent ...
+            result = await answer_financial_query_async(query)
+            text = result.get("answer", "")
 
-        if not text:
-            raise HTTPException(status_code=404, detail="No data found for visualization.")
+            if not text:
+                raise HTTPException(status_code=404, detail="No data found for visualization.")
 
-        # Step 2️⃣: Extract structured numeric data
-        df = extract_data_from_text(text)
+            # Step 2️⃣: ... and extract structured numeric data from it
+            df = extract_data_from_text(text)
+            data_source = "llm"
         if df.empty:
             raise HTTPException(status_code=400, detail="No numeric data detected for visualization.")
 
-        # Step 3️⃣: Generate high-quality visualization
-        plt.style.use("seaborn-v0_8")
-        plt.figure(figsize=(7, 4))
-
-        # Handle chart type
-        if chart_type == "line" and "Year" in df.columns:
-            plt.plot(df["Year"], df["Value"], marker="o", linewidth=2, color="#2E8B57")
-            plt.fill_between(df["Year"], df["Value"], alpha=0.2, color="#90EE90")
-        elif chart_type == "bar":
-            labels = df["Year"] if "Year" in df.columns else df["Label"]
-            plt.bar(labels, df["Value"], color="#4682B4")
-        elif chart_type == "pie":
-            labels = df["Label"] if "Label" in df.columns else df["Year"].astype(str)
-            plt.pie(df["Value"], labels=labels, autopct="%1.1f%%", startangle=90,
-                    colors=plt.cm.Paired.colors)
-        else:
-            plt.bar(df["Year"], df["Value"], color="#808080")
-
-        plt.title(f"{company} — {query.capitalize()}", fontsize=12, pad=10)
-        plt.xlabel("Year" if "Year" in df.columns else "Category")
-        plt.ylabel("Value")
-        plt.grid(alpha=0.3)
-
-        # Step 4️⃣: Convert to Base64
-        buf = io.BytesIO()
-        plt.tight_layout()
-        plt.savefig(buf, format="png", dpi=150)
-        buf.seek(0)
-        base64_img = base64.b64encode(buf.read()).decode("utf-8")
-        plt.close()
-
-        # Step 5️⃣: Generate summary insight
+        # Step 3️⃣: Render in the chart pool (cached by chart content)
+        spec = build_spec(df, chart_type, f"{company} — {query.capitalize()}", request.image_format or CHART_FORMAT)
+        chart_key, image = await get_chart_renderer().render(spec)
+
+        # Step 4️⃣: Generate summary insight
         trend = "increased" if df["Value"].iloc[-1] > df["Value"].iloc[0] else "decreased"
         change = round(((df["Value"].iloc[-1] - df["Value"].iloc[0]) / df["Value"].iloc[0]) * 100, 2)
         insight = f"{company}'s {query.lower()} has {trend} by {change}% from {df.iloc[0,0]} to {df.iloc[-1,0]}."
 
-        # Step 6️⃣: Prepare Response
+        # Step 5️⃣: Prepare Response
         return {
             "status": "success",
             "company": company,
             "query": query,
             "chart_type": chart_type,
+            "data_source": data_source,
             "data": df.to_dict(orient="records"),
-            "chart_base64": base64_img,
+            "chart_url": f"/charts/{chart_key}.{spec['format']}",
+            "chart_etag": chart_key,
+            "chart_base64": base64.b64encode(image).decode("utf-8") if request.inline_image else None,
             "insight": insight,
             "text_summary": text
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Visualization failed: {e}")
+
+
+# =========================
+# Rendered Charts
+# =========================
+@router.get("/charts/{name}")
+async def get_chart(name: str, request: Request):
+    chart_key, _, fmt = name.partition(".")
+    etag = f'"{chart_key}"'
+    # The key is a hash of everything that goes into the chart, so a matching ETag is always current
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    found = await get_chart_renderer().get(chart_key)
+    if found is None or found[0]["format"] != fmt:
+        raise HTTPException(status_code=404, detail="Chart not found or expired.")
+    return Response(
+        content=found[1],
+        media_type=MEDIA_TYPES[fmt],
+        headers={"ETag": etag, "Cache-Control": f"public, max-age={int(CHART_SPEC_TTL)}, immutable"},
+    )
+
+
+@router.get("/chart_cache_stats")
+def chart_cache_stats():
+    return chart_renderer_stats()
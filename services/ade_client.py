@@ -0,0 +1,267 @@
+"""
+Async LandingAI ADE client
+--------------------------
+Non-blocking drop-in for the helpers in services/ade_parser.py.
+
+One shared httpx.AsyncClient keeps a keep-alive connection pool to the ADE
+API. Uploads are streamed straight from the in-memory bytes or the spooled
+UploadFile buffer, so nothing is written to /tmp. Every endpoint can be
+pointed at a local stub server through the same env vars ade_parser uses.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+from typing import BinaryIO, Optional, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+ADE_PARSE_JOBS_URL = os.getenv("LANDINGAI_ENDPOINT_HOST", "https://api.va.landing.ai/v1/ade/parse/jobs")
+ADE_JOB_STATUS_URL = os.getenv("LANDINGAI_JOB_STATUS", "https://api.va.landing.ai/v1/ade/parse/jobs/")
+ADE_EXTRACT_URL = os.getenv("LANDINGAI_FIELDS_EXTRACT", "https://api.va.landing.ai/v1/ade/extract")
+
+ADE_CONNECT_TIMEOUT = float(os.getenv("ADE_CONNECT_TIMEOUT", "10"))
+ADE_READ_TIMEOUT = float(os.getenv("ADE_READ_TIMEOUT", "120"))
+ADE_MAX_CONNECTIONS = int(os.getenv("ADE_MAX_CONNECTIONS", "20"))
+ADE_MAX_RETRIES = int(os.getenv("ADE_MAX_RETRIES", "3"))
+ADE_BACKOFF_BASE = float(os.getenv("ADE_BACKOFF_BASE", "0.5"))
+ADE_BACKOFF_MAX = float(os.getenv("ADE_BACKOFF_MAX", "10"))
+
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Non-idempotent requests (parse-job submit) are only retried when ADE cannot have acted on them
+UNSENT_RETRY_STATUS_CODES = {429}
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+Upload = Union[bytes, bytearray, BinaryIO]
+
+
+def _api_key() -> str:
+    # Read at call time so /load_api_key takes effect without a restart
+    return os.environ.get("VISION_AGENT_API_KEY", "")
+
+
+def _auth_headers() -> dict:
+    api_key = _api_key()
+    if not api_key:
+        # Fail before the request instead of sending an empty Bearer token
+        raise ADEError("VISION_AGENT_API_KEY not set (set it in the environment / .env or via /load_api_key)")
+    return {"Authorization": f"Bearer {api_key}"}
+
+
+def _as_stream(upload: Upload) -> BinaryIO:
+    """Wrap raw bytes in a buffer; rewind file-like uploads so retries resend the whole body."""
+    if isinstance(upload, (bytes, bytearray)):
+        return io.BytesIO(upload)
+    upload.seek(0)
+    return upload
+
+
+class ADEError(ValueError):
+    """Raised when the ADE API returns a non-retryable error or retries run out."""
+
+
+# =====================================================
+# Client
+# =====================================================
+class AsyncADEClient:
+    """Pooled async client for the LandingAI ADE parse / status / extract endpoints."""
+
+    def __init__(
+        self,
+        parse_url: str = ADE_PARSE_JOBS_URL,
+        status_url: str = ADE_JOB_STATUS_URL,
+        extract_url: str = ADE_EXTRACT_URL,
+        connect_timeout: float = ADE_CONNECT_TIMEOUT,
+        read_timeout: float = ADE_READ_TIMEOUT,
+        max_connections: int = ADE_MAX_CONNECTIONS,
+        max_retries: int = ADE_MAX_RETRIES,
+        backoff_base: float = ADE_BACKOFF_BASE,
+        backoff_max: float = ADE_BACKOFF_MAX,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.parse_url = parse_url
+        self.status_url = status_url
+        self.extract_url = extract_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            transport=transport,
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spread retries from many callers instead of synchronising them
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _request(
+        self, method: str, url: str, rewind: tuple = (), idempotent: bool = True, **kwargs
+    ) -> httpx.Response:
+        """
+        Send a request, retrying transport errors and retryable status codes with backoff.
+        With idempotent=False only connect errors and 429 are retried: a read timeout
+        or 5xx may mean the request was applied, and resending it would do it twice.
+        """
+        retry_statuses = RETRY_STATUS_CODES if idempotent else UNSENT_RETRY_STATUS_CODES
+        retry_errors = httpx.TransportError if idempotent else UNSENT_ERRORS
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            for stream in rewind:
+                stream.seek(0)
+            try:
+                response = await self._client.request(method, url, **kwargs)
+                if response.status_code in retry_statuses:
+                    last_error = ADEError(f"ADE {method} {url} returned {response.status_code}: {response.text[:200]}")
+                elif response.status_code in RETRY_STATUS_CODES:
+                    raise ADEError(f"ADE {method} {url} returned {response.status_code} (not retried): {response.text[:200]}")
+                else:
+                    return response
+            except retry_errors as e:
+                last_error = e
+            except httpx.TransportError as e:
+                raise ADEError(f"ADE {method} {url} failed (not retried, it may have been applied): {e!r}") from e
+
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt)
+                logger.warning(f"ADE {method} {url} failed ({last_error}); retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+        raise ADEError(f"ADE {method} {url} failed after {self.max_retries + 1} attempts: {last_error}")
+
+    async def submit_parse_job(self, upload: Upload, filename: str, model: str = "dpt-2-latest") -> dict:
+        """Submit a document to the ADE parse-jobs endpoint and return the job response."""
+        stream = _as_stream(upload)
+        response = await self._request(
+            "POST",
+            self.parse_url,
+            rewind=(stream,),
+            # A resent submit that ADE already accepted would start (and bill) a second, untracked job
+            idempotent=False,
+            headers=_auth_headers(),
+            files={"document": (filename, stream)},
+            data={"model": model},
+        )
+        logger.info(f"LandingAI ADE job response: {response.status_code}")
+        return response.json()
+
+    async def get_job_status(self, job_id: str) -> dict:
+        """Check the status of an ADE job."""
+        response = await self._request("GET", f"{self.status_url}{job_id}", headers=_auth_headers())
+        if response.status_code != 200:
+            raise ADEError("Failed to check LandingAI ADE job status.")
+        return response.json()
+
+    async def get_output(self, output_url: str) -> dict:
+        """Fetch the ADE output JSON from the (pre-signed) output URL."""
+        response = await self._request("GET", output_url)
+        if response.status_code != 200:
+            raise ADEError("Failed to fetch LandingAI ADE output.")
+        logger.info("LandingAI ADE output fetched successfully.")
+        return response.json()
+
+    async def download_output(self, output_url: str, dest_path: str, chunk_size: int = 1024 * 1024) -> str:
+        """Stream the ADE output JSON to disk without holding it in memory."""
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            tmp_path = f"{dest_path}.part"
+            try:
+                async with self._client.stream("GET", output_url) as response:
+                    if response.status_code != 200:
+                        raise ADEError(f"Failed to fetch LandingAI ADE output ({response.status_code}).")
+                    with open(tmp_path, "wb") as f:
+                        async for block in response.aiter_bytes(chunk_size):
+                            f.write(block)
+                os.replace(tmp_path, dest_path)
+                logger.info(f"LandingAI ADE output streamed to {dest_path}.")
+                return dest_path
+            except httpx.TransportError as e:
+                last_error = e
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self._backoff(attempt))
+        raise ADEError(f"Streaming ADE output failed after {self.max_retries + 1} attempts: {last_error}")
+
+    async def extract_fields(self, ade_output: dict, schema_content: str, model: str = "extract-latest") -> dict:
+        """Run schema-based field extraction over the ADE markdown."""
+        markdown = io.BytesIO(json.dumps(ade_output.get("markdown")).encode("utf-8"))
+        response = await self._request(
+            "POST",
+            self.extract_url,
+            rewind=(markdown,),
+            headers=_auth_headers(),
+            files={"markdown": ("ade_output.json", markdown)},
+            data={"schema": schema_content, "model": model},
+        )
+        return response.json()
+
+
+# =====================================================
+# Shared instance + drop-in helpers
+# =====================================================
+_client: Optional[AsyncADEClient] = None
+
+
+def get_ade_client() -> AsyncADEClient:
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = AsyncADEClient()
+    return _client
+
+
+async def close_ade_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+_schema_content: Optional[str] = None
+
+
+def load_schema() -> str:
+    global _schema_content
+    if _schema_content is None:
+        with open("schema_content.json", "r") as f:
+            _schema_content = f.read()
+    return _schema_content
+
+
+async def call_landingai_ade_jobs(file: Upload, filename: str):
+    """Async counterpart of ade_parser.call_landingai_ade_jobs; accepts bytes or a file-like buffer."""
+    logger.info("Calling LandingAI ADE API.")
+    return await get_ade_client().submit_parse_job(file, filename)
+
+
+async def Status_landingai_ade_jobs(job_id: str):
+    """Async counterpart of ade_parser.Status_landingai_ade_jobs."""
+    return await get_ade_client().get_job_status(job_id)
+
+
+async def get_landingai_ade_output(output_url: str):
+    """Async counterpart of ade_parser.get_landingai_ade_output."""
+    return await get_ade_client().get_output(output_url)
+
+
+async def download_landingai_ade_output(output_url: str, dest_path: str):
+    """Stream the ADE output to `dest_path` instead of loading it (see services/streaming_ingest.py)."""
+    return await get_ade_client().download_output(output_url, dest_path)
+
+
+async def extract_fields_from_ade_output(ade_output: dict):
+    """Async counterpart of ade_parser.extract_fields_from_ade_output."""
+    logger.info("Extracting fields from ADE output using schema.")
+    return await get_ade_client().extract_fields(ade_output, load_schema())
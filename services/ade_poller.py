@@ -0,0 +1,269 @@
+"""
+Central ADE job poller
+----------------------
+One scheduler that watches every in-flight LandingAI ADE parse job,
+instead of one polling loop per submitted document.
+
+- Pending job IDs live in a single min-heap ordered by next poll time.
+- Each job backs off exponentially with jitter between polls.
+- A token bucket caps the total status-request rate across all jobs.
+- Jobs that come due together are checked in one concurrent batch.
+- Finished jobs are handed to a completion hook, which by default moves
+  them into the durable ingest queue (services/job_queue.py).
+
+Run exactly one per deployment:
+
+    python -m services.ade_poller
+
+It reads .env itself (the API does so through the agent module), so
+VISION_AGENT_API_KEY must be in its environment or .env: POST /load_api_key
+only sets the key in the API process.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import signal
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+# Before the services below read their configuration from the environment
+load_dotenv()
+
+from services import job_queue
+from services.ade_client import Status_landingai_ade_jobs, close_ade_client
+from services.mongo_store import save_service_stats
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+POLL_BASE_DELAY = float(os.getenv("ADE_POLL_BASE_DELAY", "5"))
+POLL_MAX_DELAY = float(os.getenv("ADE_POLL_MAX_DELAY", "60"))
+POLL_RATE_PER_SEC = float(os.getenv("ADE_POLL_RATE_PER_SEC", "5"))
+POLL_BURST = int(os.getenv("ADE_POLL_BURST", "10"))
+POLL_MAX_BATCH = int(os.getenv("ADE_POLL_MAX_BATCH", "50"))
+STORE_SYNC_SECONDS = float(os.getenv("ADE_POLL_SYNC_SECONDS", "5"))
+STATS_FLUSH_SECONDS = float(os.getenv("ADE_POLL_STATS_SECONDS", "10"))
+
+IN_PROGRESS_STATES = {"pending", "processing", "running", "queued"}
+POLLER_STATS_KEY = "ade_poller"
+
+CompletionHook = Callable[[str, dict], Awaitable[None]]
+
+
+@dataclass
+class _TrackedJob:
+    job_id: str
+    added_at: float = field(default_factory=time.monotonic)
+    polls: int = 0
+    errors: int = 0
+
+
+class _TokenBucket:
+    """Global request-rate cap shared by every status check."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def dispatch_to_ingest(job_id: str, status: dict):
+    """Default completion hook: hand the parsed job to the ingest workers."""
+    await asyncio.to_thread(job_queue.dispatch_job, job_id, output_url=status.get("output_url"))
+
+
+async def reject_job(job_id: str, status: dict):
+    """Default failure hook: record that ADE could not parse the document."""
+    await asyncio.to_thread(job_queue.reject_pending_job, job_id, f"ADE job ended with status {status.get('status')}")
+
+
+class ADEJobPoller:
+    def __init__(
+        self,
+        on_complete: CompletionHook = dispatch_to_ingest,
+        on_failure: CompletionHook = reject_job,
+        base_delay: float = POLL_BASE_DELAY,
+        max_delay: float = POLL_MAX_DELAY,
+        rate_per_sec: float = POLL_RATE_PER_SEC,
+        burst: int = POLL_BURST,
+        max_batch: int = POLL_MAX_BATCH,
+        status_fn: Callable[[str], Awaitable[dict]] = Status_landingai_ade_jobs,
+    ):
+        self.on_complete = on_complete
+        self.on_failure = on_failure
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._status_fn = status_fn
+        self._bucket = _TokenBucket(rate_per_sec, burst)
+        self._heap = []
+        self._jobs: Dict[str, _TrackedJob] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._counters = {"polls": 0, "completed": 0, "failed": 0, "errors": 0}
+
+    # -------------------------------
+    # Scheduling
+    # -------------------------------
+    def _next_delay(self, job: _TrackedJob) -> float:
+        # Exponential backoff with "equal jitter": never poll sooner than half the nominal delay
+        delay = min(self.max_delay, self.base_delay * (2 ** max(job.polls - 1, 0)))
+        return random.uniform(delay / 2, delay)
+
+    def _schedule(self, job: _TrackedJob, delay: float):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), job.job_id))
+
+    def track(self, job_id: str, first_delay: Optional[float] = None):
+        """Start watching a job; a no-op if it is already tracked."""
+        if job_id in self._jobs:
+            return
+        job = _TrackedJob(job_id)
+        self._jobs[job_id] = job
+        self._schedule(job, self.base_delay if first_delay is None else first_delay)
+        self._wakeup.set()
+
+    def untrack(self, job_id: str):
+        # Heap entries for untracked jobs are skipped lazily when they come due
+        self._jobs.pop(job_id, None)
+
+    def _pop_due(self) -> list:
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.max_batch:
+            _, _, job_id = heapq.heappop(self._heap)
+            if job_id in self._jobs:
+                due.append(self._jobs[job_id])
+        return due
+
+    # -------------------------------
+    # Polling
+    # -------------------------------
+    async def _check(self, job: _TrackedJob):
+        await self._bucket.acquire()
+        job.polls += 1
+        self._counters["polls"] += 1
+        try:
+            status = await self._status_fn(job.job_id)
+        except Exception as e:
+            job.errors += 1
+            self._counters["errors"] += 1
+            logger.warning(f"Status check for ADE job {job.job_id} failed: {e}")
+            self._schedule(job, self._next_delay(job))
+            return
+
+        state = status.get("status")
+        if state in IN_PROGRESS_STATES:
+            self._schedule(job, self._next_delay(job))
+            return
+
+        self.untrack(job.job_id)
+        if state == "completed":
+            self._counters["completed"] += 1
+            hook = self.on_complete
+        else:
+            self._counters["failed"] += 1
+            hook = self.on_failure
+        try:
+            await hook(job.job_id, status)
+        except Exception as e:
+            logger.exception(f"Completion hook for ADE job {job.job_id} failed: {e}")
+
+    async def poll_once(self):
+        """Check every job that is currently due, as one concurrent batch."""
+        due = self._pop_due()
+        if due:
+            await asyncio.gather(*(self._check(job) for job in due))
+        return len(due)
+
+    async def _sleep_until_due(self):
+        timeout = self.max_delay
+        if self._heap:
+            timeout = max(0.0, self._heap[0][0] - time.monotonic())
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    # -------------------------------
+    # Introspection
+    # -------------------------------
+    def stats(self) -> dict:
+        now = time.monotonic()
+        oldest = max((now - j.added_at for j in self._jobs.values()), default=0.0)
+        next_due = max(0.0, self._heap[0][0] - now) if self._heap else None
+        return {
+            "queue_depth": len(self._jobs),
+            "oldest_pending_seconds": round(oldest, 1),
+            "next_poll_in_seconds": None if next_due is None else round(next_due, 2),
+            **self._counters,
+        }
+
+    # -------------------------------
+    # Service loop
+    # -------------------------------
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    async def _sync_from_store(self):
+        # Picks up jobs submitted by API processes, and everything pending after a restart
+        while not self._stopping.is_set():
+            try:
+                for job_id in await asyncio.to_thread(job_queue.pending_job_ids):
+                    self.track(job_id, first_delay=0)
+            except Exception as e:
+                logger.warning(f"Failed to load pending ADE jobs: {e}")
+            await asyncio.sleep(STORE_SYNC_SECONDS)
+
+    async def _flush_stats(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.to_thread(save_service_stats, POLLER_STATS_KEY, self.stats())
+            except Exception as e:
+                logger.warning(f"Failed to persist poller stats: {e}")
+            await asyncio.sleep(STATS_FLUSH_SECONDS)
+
+    async def run(self):
+        background = [asyncio.create_task(self._sync_from_store()), asyncio.create_task(self._flush_stats())]
+        try:
+            while not self._stopping.is_set():
+                await self.poll_once()
+                await self._sleep_until_due()
+        finally:
+            for task in background:
+                task.cancel()
+            await close_ade_client()
+
+
+async def _main():
+    poller = ADEJobPoller()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, poller.stop)
+    await poller.run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,176 @@
+"""
+Semantic answer cache
+---------------------
+Sits in front of retrieval + synthesize_answer: a question whose embedding
+is within ANSWER_CACHE_THRESHOLD cosine similarity of an earlier question
+about the same company gets the earlier answer (and sources) back without
+another LLM call. Off unless ANSWER_CACHE_ENABLED=1.
+
+- the numbers in a question (years, quarters, amounts) must match exactly:
+  "revenue 2023" and "revenue 2024" embed well above the threshold, but
+  must not share an answer
+
+- entries expire after ANSWER_CACHE_TTL; the least recently used entry is
+  evicted past ANSWER_CACHE_SIZE
+- invalidation: chunk_store / save_schema_document bump the company's data
+  version in Mongo (mongo_store.bump_company_version), so writes made by the
+  ingest workers reach every API process. Entries remember the version they
+  were answered at and stop matching once it moves. The version is re-read
+  at most every ANSWER_CACHE_VERSION_TTL seconds per company.
+"""
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from services.lru_cache import TTLCache
+from services.mongo_store import get_company_version, normalize_company_name
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "0") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2048"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_VERSION_TTL = float(os.getenv("ANSWER_CACHE_VERSION_TTL", "5"))
+
+
+_NUMBER_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def query_numbers(query: str) -> frozenset:
+    """The numbers a question mentions ('FY2024', 'Q3', '1,000'); cached answers only match the same set."""
+    return frozenset(n.replace(",", "") for n in _NUMBER_RE.findall(query or ""))
+
+
+def _unit(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        maxsize: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        version_ttl: float = ANSWER_CACHE_VERSION_TTL,
+    ):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # entry id -> (company key, numbers, unit vector, result, data version, expires_at), in LRU order
+        self._entries = OrderedDict()
+        self._by_company = {}
+        self._ids = itertools.count()
+        self._versions = TTLCache(maxsize=100_000, ttl=version_ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_llm_calls = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _version(self, company_key: str):
+        version = self._versions.get(company_key)
+        if version is None:
+            version = get_company_version(company_key)
+            self._versions.put(company_key, version)
+        return version
+
+    def _drop(self, entry_id):
+        company_key = self._entries.pop(entry_id)[0]
+        ids = self._by_company.get(company_key)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_company[company_key]
+
+    def lookup(self, company: str, query: str, query_vector) -> Optional[dict]:
+        """The cached result for the most similar earlier question about `company` (same numbers), if close enough."""
+        company_key = normalize_company_name(company)
+        try:
+            version = self._version(company_key)
+        except Exception as e:
+            logger.warning(f"Answer cache version check failed, bypassing cache: {e}")
+            return None
+
+        numbers = query_numbers(query)
+        q = _unit(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_sim = None, self.threshold
+            for entry_id in list(self._by_company.get(company_key, ())):
+                _, entry_numbers, vector, _, entry_version, expires_at = self._entries[entry_id]
+                if expires_at <= now or entry_version != version:
+                    self._drop(entry_id)
+                    self.invalidations += entry_version != version
+                    continue
+                if entry_numbers != numbers:
+                    continue
+                sim = float(vector @ q)
+                if sim >= best_sim:
+                    best_id, best_sim = entry_id, sim
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            result = self._entries[best_id][3]
+            self.hits += 1
+            if result.get("sources"):
+                self.saved_llm_calls += 1
+        return {**result, "cache_similarity": round(best_sim, 4)}
+
+    def store(self, company: str, query: str, query_vector, result: dict):
+        company_key = normalize_company_name(company)
+        try:
+            version = self._version(company_key)
+        except Exception:
+            return
+        entry_id = next(self._ids)
+        with self._lock:
+            self._entries[entry_id] = (
+                company_key, query_numbers(query), _unit(query_vector), result, version, time.monotonic() + self.ttl,
+            )
+            self._by_company.setdefault(company_key, set()).add(entry_id)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_llm_calls": self.saved_llm_calls,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+_cache = SemanticAnswerCache()
+
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """The process-wide cache, or None unless ANSWER_CACHE_ENABLED=1."""
+    return _cache if ANSWER_CACHE_ENABLED else None
+
+
+def answer_cache_stats() -> dict:
+    return _cache.stats()
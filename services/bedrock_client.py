@@ -1,26 +1,142 @@
-import subprocess
-import json
+"""
+AWS Bedrock provider
+--------------------
+Calls Bedrock's Converse API through one long-lived boto3 `bedrock-runtime`
+client per process and region, shared by the registered LLM provider and
+every BedrockLLM. Credentials are resolved once and HTTPS connections
+are pooled, so a call costs only its network round-trip (the old path
+started an `aws` CLI process per generation).
+
+Env:
+    BEDROCK_MODEL_ID          e.g. anthropic.claude-3-haiku-20240307-v1:0
+    BEDROCK_REGION            default us-east-1
+    BEDROCK_ENDPOINT_URL      override, e.g. a local stub for tests
+    BEDROCK_MAX_CONNECTIONS   HTTP pool size
+    BEDROCK_CONNECT_TIMEOUT / BEDROCK_READ_TIMEOUT   seconds
+    BEDROCK_MAX_RETRIES       botocore adaptive retries
+    BEDROCK_MAX_TOKENS        answer cap when LLM_MAX_TOKENS is unset (Converse requires one)
+"""
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from services.llm_providers import LLM_MAX_TOKENS, LLMProvider
+
+# =====================================================
+# Configuration
+# =====================================================
+BEDROCK_MODEL_ID = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-haiku-20240307-v1:0")
+BEDROCK_REGION = os.getenv("BEDROCK_REGION", "us-east-1")
+BEDROCK_ENDPOINT_URL = os.getenv("BEDROCK_ENDPOINT_URL") or None
+BEDROCK_MAX_CONNECTIONS = int(os.getenv("BEDROCK_MAX_CONNECTIONS", "20"))
+BEDROCK_CONNECT_TIMEOUT = float(os.getenv("BEDROCK_CONNECT_TIMEOUT", "5"))
+BEDROCK_READ_TIMEOUT = float(os.getenv("BEDROCK_READ_TIMEOUT", "60"))
+BEDROCK_MAX_RETRIES = int(os.getenv("BEDROCK_MAX_RETRIES", "3"))
+BEDROCK_MAX_TOKENS = int(os.getenv("BEDROCK_MAX_TOKENS", "1024"))
+
+_clients: Dict[Tuple[str, Optional[str]], object] = {}
+_clients_lock = threading.Lock()
+
+
+def get_bedrock_client(region: str = BEDROCK_REGION, endpoint_url: Optional[str] = BEDROCK_ENDPOINT_URL):
+    """The process-wide pooled bedrock-runtime client for a region (and endpoint override)."""
+    key = (region, endpoint_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            import boto3
+            from botocore.config import Config
+
+            client = boto3.client(
+                "bedrock-runtime",
+                region_name=region,
+                endpoint_url=endpoint_url,
+                config=Config(
+                    max_pool_connections=BEDROCK_MAX_CONNECTIONS,
+                    connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+                    read_timeout=BEDROCK_READ_TIMEOUT,
+                    retries={"max_attempts": BEDROCK_MAX_RETRIES, "mode": "adaptive"},
+                    tcp_keepalive=True,
+                ),
+            )
+            _clients[key] = client
+    return client
+
+
+def _to_converse(messages: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """OpenAI-style messages → Converse (system blocks, messages)."""
+    system = [{"text": m["content"]} for m in messages if m["role"] == "system"]
+    turns = [
+        {"role": m["role"], "content": [{"text": m["content"]}]}
+        for m in messages
+        if m["role"] in ("user", "assistant")
+    ]
+    return system, turns
+
+
+class BedrockProvider(LLMProvider):
+    name = "bedrock"
+
+    def __init__(
+        self,
+        model_id: str = BEDROCK_MODEL_ID,
+        region: str = BEDROCK_REGION,
+        endpoint_url: Optional[str] = BEDROCK_ENDPOINT_URL,
+        client=None,
+    ):
+        self.model_id = model_id
+        self.region = region
+        self.client = client if client is not None else get_bedrock_client(region, endpoint_url)
+
+    def _request(self, messages, temperature, max_tokens) -> dict:
+        system, turns = _to_converse(messages)
+        request = {
+            "modelId": self.model_id,
+            "messages": turns,
+            "inferenceConfig": {
+                "temperature": temperature,
+                "maxTokens": BEDROCK_MAX_TOKENS if max_tokens is None else max_tokens,
+            },
+        }
+        if system:
+            request["system"] = system
+        return request
+
+    def complete(self, messages, temperature=0.2, max_tokens=LLM_MAX_TOKENS) -> str:
+        response = self.client.converse(**self._request(messages, temperature, max_tokens))
+        blocks = response["output"]["message"]["content"]
+        return "".join(b.get("text", "") for b in blocks).strip()
+
+    def stream(self, messages, temperature=0.2, max_tokens=LLM_MAX_TOKENS) -> Iterator[str]:
+        response = self.client.converse_stream(**self._request(messages, temperature, max_tokens))
+        for event in response["stream"]:
+            text = event.get("contentBlockDelta", {}).get("delta", {}).get("text")
+            if text:
+                yield text
+
+    def close(self):
+        # Shared clients are closed (and forgotten) once, at shutdown
+        with _clients_lock:
+            for key, client in list(_clients.items()):
+                if client is self.client:
+                    del _clients[key]
+        self.client.close()
+
 
 class BedrockLLM:
+    """
+    Prompt-in / text-out wrapper kept for existing callers; uses the pooled
+    Bedrock client instead of the `aws` CLI.
+    """
+
     def __init__(self, model_id: str, region: str = "us-east-1"):
         self.model_id = model_id
         self.region = region
+        # Same boto3 client as the registered provider (and every other BedrockLLM) in this region
+        self._provider = BedrockProvider(model_id=model_id, region=region, client=get_bedrock_client(region))
 
     def generate(self, prompt: str, temperature: float = 0.2, max_tokens: int = 512) -> str:
         try:
-            cmd = [
-                "aws", "bedrock", "invoke-model",
-                "--model-id", self.model_id,
-                "--body", json.dumps({"inputText": prompt}),
-                "--region", self.region
-            ]
-
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            output = json.loads(result.stdout)
-            # Output structure: {'body': '{"completion":"..."}', ...}
-            if "body" in output:
-                body_json = json.loads(output["body"])
-                return body_json.get("completion", "")
-            return str(output)
-        except subprocess.CalledProcessError as e:
-            return f"Error calling Bedrock CLI: {e.stderr}"
+            return self._provider.complete([{"role": "user", "content": prompt}], temperature, max_tokens)
+        except Exception as e:
+            return f"Error calling Bedrock: {e}"
@@ -0,0 +1,237 @@
+"""
+Chart rendering pool
+--------------------
+Renders /visualize_router charts off the event loop. Charts are drawn with
+matplotlib's object-oriented Figure API (no pyplot global state) in a small
+process pool, so concurrent requests neither block the loop nor share a
+figure, and at most CHART_RENDER_WORKERS charts are drawn at once.
+
+A chart is described by a plain, JSON-able spec (chart type, columns, rows,
+title, labels, style, format, dpi). Its key is a hash of that spec:
+
+- rendered bytes are kept in an LRU (CHART_CACHE_SIZE, CHART_CACHE_TTL), so
+  a repeated dashboard chart is served without drawing it again
+- concurrent requests for the same key share one render
+- the key doubles as the ETag of GET /charts/{key}.{format}; specs are kept
+  longer than their bytes (CHART_SPEC_TTL), so an evicted chart is
+  re-rendered on demand for as long as clients may cache its URL
+
+CHART_RENDER_TIMEOUT_SECONDS bounds how long a request waits for a render;
+it does not kill the worker, which finishes the chart (and stays busy)
+in the background. A worker that dies breaks the whole pool, so the pool
+is replaced and the render retried once.
+
+Caches are per API process.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from services.lru_cache import TTLCache
+from services.resources import register
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "2"))
+CHART_RENDER_TIMEOUT_SECONDS = float(os.getenv("CHART_RENDER_TIMEOUT_SECONDS", "20"))
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "256"))
+CHART_CACHE_TTL = float(os.getenv("CHART_CACHE_TTL", "3600"))
+# Never shorter than the bytes' TTL; GET /charts/{key} is cacheable for this long
+CHART_SPEC_TTL = max(float(os.getenv("CHART_SPEC_TTL", str(7 * 24 * 3600))), CHART_CACHE_TTL)
+CHART_STYLE = os.getenv("CHART_STYLE", "seaborn-v0_8")
+CHART_DPI = int(os.getenv("CHART_DPI", "150"))
+CHART_FORMAT = os.getenv("CHART_FORMAT", "png")
+
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+# =====================================================
+# Worker-process side
+# =====================================================
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+    # Pay the font-cache / pyplot-free import cost once per worker, not per chart
+    from matplotlib.figure import Figure  # noqa: F401
+
+
+def _render_chart(spec: Dict) -> bytes:
+    import matplotlib
+    import matplotlib.style
+    from matplotlib.figure import Figure
+
+    data = {column: [row[i] for row in spec["rows"]] for i, column in enumerate(spec["columns"])}
+    values = data["Value"]
+    chart_type = spec["chart_type"]
+
+    with matplotlib.style.context(spec["style"]):
+        fig = Figure(figsize=(7, 4))
+        ax = fig.subplots()
+
+        if chart_type == "line" and "Year" in data:
+            ax.plot(data["Year"], values, marker="o", linewidth=2, color="#2E8B57")
+            ax.fill_between(data["Year"], values, alpha=0.2, color="#90EE90")
+        elif chart_type == "bar":
+            labels = data["Year"] if "Year" in data else data["Label"]
+            ax.bar(labels, values, color="#4682B4")
+        elif chart_type == "pie":
+            labels = data["Label"] if "Label" in data else [str(y) for y in data["Year"]]
+            ax.pie(values, labels=labels, autopct="%1.1f%%", startangle=90,
+                   colors=matplotlib.colormaps["Paired"].colors)
+        else:
+            ax.bar(data.get("Year", data.get("Label")), values, color="#808080")
+
+        ax.set_title(spec["title"], fontsize=12, pad=10)
+        ax.set_xlabel(spec["xlabel"])
+        ax.set_ylabel("Value")
+        ax.grid(alpha=0.3)
+        fig.tight_layout()
+
+        buf = io.BytesIO()
+        # No timestamps in the output: the same spec always yields the same bytes
+        metadata = {"Date": None} if spec["format"] == "svg" else {"Software": None}
+        fig.savefig(buf, format=spec["format"], dpi=spec["dpi"], metadata=metadata)
+    return buf.getvalue()
+
+
+# =====================================================
+# Parent-process side
+# =====================================================
+def build_spec(df, chart_type: str, title: str, fmt: str = CHART_FORMAT) -> Dict:
+    """Chart spec for a Year/Label + Value frame, as extracted by visual_route."""
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported chart format: {fmt!r} (expected one of {sorted(MEDIA_TYPES)})")
+    return {
+        "chart_type": chart_type,
+        "columns": [str(c) for c in df.columns],
+        # tolist() turns numpy scalars into plain ints / floats, so the spec is JSON-able
+        "rows": df.values.tolist(),
+        "title": title,
+        "xlabel": "Year" if "Year" in df.columns else "Category",
+        "style": CHART_STYLE,
+        "format": fmt,
+        "dpi": CHART_DPI,
+    }
+
+
+def chart_key(spec: Dict) -> str:
+    canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+class ChartRenderer:
+    def __init__(
+        self,
+        workers: int = CHART_RENDER_WORKERS,
+        cache_size: int = CHART_CACHE_SIZE,
+        ttl: float = CHART_CACHE_TTL,
+        spec_ttl: float = CHART_SPEC_TTL,
+        timeout: float = CHART_RENDER_TIMEOUT_SECONDS,
+    ):
+        self.timeout = timeout
+        self.workers = workers
+        self._executor = self._start_pool()
+        self._charts = TTLCache(maxsize=cache_size, ttl=ttl)
+        # Specs are small: keep many more of them, for longer, so evicted charts can be redrawn from their URL
+        self._specs = TTLCache(maxsize=cache_size * 16, ttl=max(spec_ttl, ttl))
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.renders = 0
+        self.shared_renders = 0
+        self.render_ms_total = 0.0
+        self.pool_restarts = 0
+        logger.info(f"Chart renderer started: {workers} workers.")
+
+    def _start_pool(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the API process holds threads (batcher, clients) that fork would copy mid-flight
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    def _restart_pool(self, broken: ProcessPoolExecutor):
+        # Only the first render to notice replaces the pool; the rest retry on the new one
+        if self._executor is broken:
+            logger.warning("Chart render pool broke (a worker died); starting a new one.")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._start_pool()
+            self.pool_restarts += 1
+
+    async def render(self, spec: Dict) -> Tuple[str, bytes]:
+        """(key, rendered bytes) for the spec, from the cache when possible."""
+        key = chart_key(spec)
+        self._specs.put(key, spec)
+        data = self._charts.get(key)
+        if data is not None:
+            return key, data
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(key, spec))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared_renders += 1
+        # shield: one caller giving up must not cancel the render the others wait on
+        return key, await asyncio.shield(task)
+
+    async def _render(self, key: str, spec: Dict) -> bytes:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self._executor
+            try:
+                # On timeout the worker keeps drawing; only this request stops waiting
+                data = await asyncio.wait_for(loop.run_in_executor(executor, _render_chart, spec), self.timeout)
+                break
+            except BrokenProcessPool:
+                self._restart_pool(executor)
+                if attempt:
+                    raise
+        self.renders += 1
+        self.render_ms_total += (time.perf_counter() - started) * 1000
+        self._charts.put(key, data)
+        return data
+
+    async def get(self, key: str) -> Optional[Tuple[Dict, bytes]]:
+        """(spec, bytes) for a key handed out earlier, or None if its spec has expired too."""
+        spec = self._specs.get(key)
+        if spec is None:
+            return None
+        _, data = await self.render(spec)
+        return spec, data
+
+    def stats(self) -> dict:
+        return {
+            **self._charts.stats(),
+            "specs": len(self._specs),
+            "renders": self.renders,
+            "shared_renders": self.shared_renders,
+            "inflight": len(self._inflight),
+            "pool_restarts": self.pool_restarts,
+            "avg_render_ms": round(self.render_ms_total / self.renders, 2) if self.renders else 0.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_renderer = register("chart_renderer", ChartRenderer, closer=lambda r: r.shutdown())
+
+
+def get_chart_renderer() -> ChartRenderer:
+    return _renderer.get()
+
+
+def chart_renderer_stats() -> dict:
+    return _renderer.get().stats() if _renderer.initialized else {"initialized": False}
@@ -0,0 +1,180 @@
+"""
+Structure-aware ADE chunker
+---------------------------
+Builds embedding chunks directly from ADE `chunks` items instead of the
+flattened markdown blob:
+
+- tables (and figure summaries) are kept whole, one chunk each
+- tiny adjacent text chunks are merged up to a token budget measured with
+  the embedder's own tokenizer; oversized text is split on sentences
+- page / chunk_type / chunk_id / bounding-box grounding is carried into
+  the chunk metadata, and from there into the Qdrant payload
+- marginalia (page headers, footers, page numbers) is dropped by default
+
+Works on any iterable of ADE items, so it composes with the streaming
+reader in services/streaming_ingest.py.
+"""
+import os
+import re
+from typing import Callable, Iterable, Iterator, List, Optional
+
+# =====================================================
+# Configuration
+# =====================================================
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_SKIP_TYPES = {t for t in os.getenv("CHUNK_SKIP_TYPES", "marginalia").split(",") if t}
+STANDALONE_TYPES = {"table", "figure"}
+
+# Precompiled once; these run over every ADE item
+_HTML_COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+_ANCHOR_RE = re.compile(r"<a id=[^>]*></a>|<::.*?::>", re.S)
+_ROW_END_RE = re.compile(r"</tr\s*>", re.I)
+_CELL_END_RE = re.compile(r"</t[dh]\s*>", re.I)
+_TAG_RE = re.compile(r"<[^>]+>")
+_INLINE_SPACE_RE = re.compile(r"[ \t\r\f\v]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+def _tidy(text: str) -> str:
+    text = _INLINE_SPACE_RE.sub(" ", text)
+    text = _BLANK_LINES_RE.sub("\n", text)
+    return "\n".join(line.strip() for line in text.split("\n")).strip()
+
+
+def clean_block(text: str) -> str:
+    """Strip ADE anchors, HTML comments and tags from a text / figure block."""
+    text = _HTML_COMMENT_RE.sub(" ", text)
+    text = _ANCHOR_RE.sub(" ", text)
+    text = _TAG_RE.sub(" ", text)
+    return _tidy(text)
+
+
+def table_to_text(html: str) -> str:
+    """Render an ADE HTML table as one pipe-delimited line per row."""
+    text = _HTML_COMMENT_RE.sub(" ", html)
+    text = _ROW_END_RE.sub("\n", text)
+    text = _CELL_END_RE.sub(" | ", text)
+    text = _TAG_RE.sub(" ", text)
+    lines = [_INLINE_SPACE_RE.sub(" ", line).strip(" |") for line in text.split("\n")]
+    return "\n".join(line for line in lines if line)
+
+
+def _default_token_counter() -> Callable[[str], int]:
+    # Imported lazily so the chunker does not pull in the model at import time
+    from services.embedder import count_tokens
+    return count_tokens
+
+
+def _groundings(item: dict) -> List[dict]:
+    grounding = item.get("grounding") or []
+    if isinstance(grounding, dict):
+        grounding = [grounding]
+    return [{"page": g.get("page", 0), "box": g.get("box")} for g in grounding if isinstance(g, dict)]
+
+
+class StructuredChunker:
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        skip_types: Optional[set] = None,
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        self.max_tokens = max_tokens
+        self.skip_types = CHUNK_SKIP_TYPES if skip_types is None else skip_types
+        self._count_tokens = count_tokens
+
+    def count_tokens(self, text: str) -> int:
+        if self._count_tokens is None:
+            self._count_tokens = _default_token_counter()
+        return self._count_tokens(text)
+
+    def _split_long(self, text: str) -> Iterator[tuple]:
+        """Pack sentences into pieces of at most max_tokens (a single huge sentence stays whole)."""
+        piece, piece_tokens = [], 0
+        for sentence in _SENTENCE_SPLIT_RE.split(text):
+            if not sentence:
+                continue
+            tokens = self.count_tokens(sentence)
+            if piece and piece_tokens + tokens > self.max_tokens:
+                yield " ".join(piece), piece_tokens
+                piece, piece_tokens = [], 0
+            piece.append(sentence)
+            piece_tokens += tokens
+        if piece:
+            yield " ".join(piece), piece_tokens
+
+    def iter_chunks(self, ade_items: Iterable[dict], company_name: str = None, source: str = "ADE") -> Iterator[dict]:
+        """Yield embedding chunks with grounding metadata from ADE `chunks` items."""
+        seq = 0
+        buffer, buffer_tokens, buffer_items = [], 0, []
+
+        def emit(text: str, tokens: int, items: List[dict], chunk_type: str) -> dict:
+            nonlocal seq
+            grounding = [g for it in items for g in _groundings(it)]
+            pages = sorted({g["page"] for g in grounding})
+            chunk = {
+                "text": text,
+                "metadata": {
+                    "source": source,
+                    "CompanyName": company_name,
+                    "chunk_index": seq,
+                    "page": pages[0] if pages else 0,
+                    "pages": pages,
+                    "type": chunk_type,
+                    "chunk_ids": [it.get("chunk_id") for it in items if it.get("chunk_id")],
+                    "grounding": grounding,
+                    "tokens": tokens,
+                },
+            }
+            seq += 1
+            return chunk
+
+        def flush():
+            nonlocal buffer, buffer_tokens, buffer_items
+            if buffer:
+                chunk = emit("\n".join(buffer), buffer_tokens, buffer_items, "text")
+                buffer, buffer_tokens, buffer_items = [], 0, []
+                return chunk
+            return None
+
+        for item in ade_items:
+            chunk_type = item.get("chunk_type") or item.get("type") or "text"
+            if chunk_type in self.skip_types:
+                continue
+            raw = item.get("markdown") or item.get("text") or ""
+
+            if chunk_type in STANDALONE_TYPES:
+                text = table_to_text(raw) if chunk_type == "table" else clean_block(raw)
+                if not text:
+                    continue
+                pending = flush()
+                if pending:
+                    yield pending
+                yield emit(text, self.count_tokens(text), [item], chunk_type)
+                continue
+
+            text = clean_block(raw)
+            if not text:
+                continue
+            tokens = self.count_tokens(text)
+
+            if tokens > self.max_tokens:
+                pending = flush()
+                if pending:
+                    yield pending
+                for piece, piece_tokens in self._split_long(text):
+                    yield emit(piece, piece_tokens, [item], chunk_type)
+                continue
+
+            if buffer_tokens + tokens > self.max_tokens:
+                pending = flush()
+                if pending:
+                    yield pending
+            buffer.append(text)
+            buffer_tokens += tokens
+            buffer_items.append(item)
+
+        pending = flush()
+        if pending:
+            yield pending
@@ -0,0 +1,213 @@
+"""
+Company-name resolver
+---------------------
+Finds every known company mentioned in a query with one pass of an
+Aho–Corasick automaton, instead of scanning Mongo and substring-checking
+each name per request.
+
+- patterns are company names and aliases from the Mongo `companies`
+  collection (`CompanyName`, optional `aliases` list), plus an optional
+  COMPANY_ALIASES_FILE ({"Company Name": ["alias", ...]}), normalized with
+  the same rules as mongo_store.normalize_company_name
+- matches must sit on word boundaries; spans refer to the original query
+- the automaton is rebuilt in the background when a change stream reports
+  a write to `companies`, or when COMPANY_RESOLVER_TTL expires and the
+  name set has changed; lookups never wait on Mongo after the first build
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from services.mongo_store import get_db, normalize_company_name
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+COMPANY_RESOLVER_TTL = float(os.getenv("COMPANY_RESOLVER_TTL", "300"))
+COMPANY_RESOLVER_WATCH = os.getenv("COMPANY_RESOLVER_WATCH", "1") == "1"
+COMPANY_ALIASES_FILE = os.getenv("COMPANY_ALIASES_FILE", "")
+
+# Same separators normalize_company_name turns into spaces
+_SEPARATORS = set(",.-&")
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: all occurrences of all patterns in one scan of the text."""
+
+    def __init__(self, patterns: Dict[str, Set[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str, frozenset]]] = [[]]
+        for pattern, payload in patterns.items():
+            self._add(pattern, frozenset(payload))
+        self._build()
+
+    def _add(self, pattern: str, payload: frozenset):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), pattern, payload))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0) if node else 0
+                # Inherit the outputs of the longest proper suffix that is also a pattern
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str, frozenset]]:
+        """Yield (start, end, pattern, payload) for every occurrence, end-exclusive."""
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, pattern, payload in out[node]:
+                yield i + 1 - length, i + 1, pattern, payload
+
+
+def _normalize_query(text: str) -> Tuple[str, List[int]]:
+    """Upper-case, separators to single spaces; offsets[i] is the source index of char i."""
+    chars, offsets = [], []
+    for i, ch in enumerate(text):
+        if ch.isspace() or ch in _SEPARATORS:
+            if chars and chars[-1] != " ":
+                chars.append(" ")
+                offsets.append(i)
+            continue
+        chars.append(ch.upper())
+        offsets.append(i)
+    return "".join(chars), offsets
+
+
+def _load_names() -> Dict[str, Set[str]]:
+    """{company name: {name, aliases...}} from Mongo and the optional aliases file."""
+    names: Dict[str, Set[str]] = {}
+    for doc in get_db()["companies"].find({}, {"CompanyName": 1, "aliases": 1}):
+        name = doc.get("CompanyName")
+        if name:
+            names.setdefault(name, {name}).update(doc.get("aliases") or [])
+    if COMPANY_ALIASES_FILE and os.path.exists(COMPANY_ALIASES_FILE):
+        with open(COMPANY_ALIASES_FILE, "r") as f:
+            for name, aliases in json.load(f).items():
+                names.setdefault(name, {name}).update(aliases)
+    return names
+
+
+class CompanyResolver:
+    def __init__(self, loader=_load_names, ttl: float = COMPANY_RESOLVER_TTL, watch: bool = COMPANY_RESOLVER_WATCH):
+        self._loader = loader
+        self.ttl = ttl
+        self._watch_enabled = watch
+        self._automaton: Optional[AhoCorasick] = None
+        self._names: Dict[str, Set[str]] = {}
+        self._loaded_at = 0.0
+        self._stale = False
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._watcher = None
+
+    def _build(self, names: Dict[str, Set[str]]) -> AhoCorasick:
+        patterns: Dict[str, Set[str]] = {}
+        for company, aliases in names.items():
+            for alias in aliases:
+                key = normalize_company_name(alias)
+                if key:
+                    patterns.setdefault(key, set()).add(company)
+        return AhoCorasick(patterns)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload names; rebuilds the automaton only if they changed. Returns whether it rebuilt."""
+        names = self._loader()
+        with self._lock:
+            self._loaded_at = time.monotonic()
+            self._stale = False
+            if not force and self._automaton is not None and names == self._names:
+                return False
+            self._automaton = self._build(names)
+            self._names = names
+        logger.info(f"Company resolver built over {len(names)} companies.")
+        return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Company resolver refresh failed: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _watch(self):
+        try:
+            with get_db()["companies"].watch() as stream:
+                for _ in stream:
+                    self._stale = True
+        except Exception as e:
+            # Standalone Mongo has no change streams; the TTL keeps the automaton fresh
+            logger.info(f"Company change stream unavailable ({e}); refreshing every {self.ttl}s.")
+
+    def _ensure_fresh(self):
+        if self._automaton is None:
+            self.refresh()
+        elif self._stale or time.monotonic() - self._loaded_at > self.ttl:
+            self._refresh_in_background()
+        if self._watch_enabled and self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
+
+    def resolve(self, query: str) -> List[dict]:
+        """Every company mentioned in the query, with the matched alias and its span in `query`."""
+        self._ensure_fresh()
+        text, offsets = _normalize_query(query)
+        matches, seen = [], set()
+        for start, end, pattern, companies in self._automaton.iter_matches(text):
+            # Whole words only: "ITC" must not match inside "SWITCH"
+            if (start > 0 and text[start - 1].isalnum()) or (end < len(text) and text[end].isalnum()):
+                continue
+            span = (offsets[start], offsets[end - 1] + 1)
+            for company in companies:
+                if (company, span) not in seen:
+                    seen.add((company, span))
+                    matches.append({"company": company, "alias": pattern, "start": span[0], "end": span[1]})
+        # Longest (most specific) mention first, then leftmost
+        matches.sort(key=lambda m: (-(m["end"] - m["start"]), m["start"]))
+        return matches
+
+    def best(self, query: str) -> Optional[str]:
+        matches = self.resolve(query)
+        return matches[0]["company"] if matches else None
+
+
+_resolver = CompanyResolver()
+
+
+def get_company_resolver() -> CompanyResolver:
+    return _resolver
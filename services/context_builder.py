@@ -0,0 +1,148 @@
+"""
+Token-budgeted context assembly
+-------------------------------
+Turns retrieved chunks into the prompt context for synthesize_answer:
+
+1. relevance order: rerank_score when present, otherwise the retrieval score
+2. cutoffs: drop chunks under CONTEXT_MIN_SCORE, and everything past the
+   score "elbow" — the first drop between neighbours that is at least
+   CONTEXT_ELBOW_RATIO of the top score (adaptive k; needs 3+ candidates).
+   The elbow only applies to similarity scores (cosine, cross-encoder):
+   hybrid retrieval's RRF scores come from rank positions, where a big
+   drop after the first hit is normal, so fused lists are never cut
+3. near-duplicates: chunks whose word-shingle set is mostly contained in an
+   already kept chunk (overlapping windows, duplicate re-ingests) are dropped
+4. budget: chunks are added in relevance order until CONTEXT_TOKEN_BUDGET
+   prompt tokens are used. The first CONTEXT_MIN_DOCS chunks are always
+   kept, truncated to the budget if needed (a whole table can exceed it)
+
+Token counts use tiktoken when it is installed (the LLM's own tokenizer),
+otherwise the embedder's tokenizer as an approximation.
+"""
+import os
+import re
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+# =====================================================
+# Configuration
+# =====================================================
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MIN_SCORE = float(os.getenv("CONTEXT_MIN_SCORE", "-inf"))
+CONTEXT_ELBOW_RATIO = float(os.getenv("CONTEXT_ELBOW_RATIO", "0.5"))
+CONTEXT_MIN_DOCS = int(os.getenv("CONTEXT_MIN_DOCS", "3"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+SHINGLE_SIZE = 5
+
+_WORD_RE = re.compile(r"\w+")
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def _default_counter(text: str) -> int:
+        return len(_encoding.encode(text))
+except ImportError:
+    def _default_counter(text: str) -> int:
+        from services.embedder import count_tokens
+        return count_tokens(text)
+
+
+def _relevance(doc: Dict) -> float:
+    score = doc.get("rerank_score", doc.get("score"))
+    return float("-inf") if score is None else score
+
+
+def _similarity_scored(docs: List[Dict]) -> bool:
+    """Whether the ranking scores measure match quality (not RRF ranks, score_type "rrf")."""
+    return bool(docs) and ("rerank_score" in docs[0] or docs[0].get("score_type") != "rrf")
+
+
+def _shingles(text: str) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_SIZE]).encode("utf-8"))
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def _elbow(scores: List[float], min_docs: int, ratio: float) -> int:
+    """How many of the (descending) scores to keep: cut at the first big drop."""
+    finite = [s for s in scores if s != float("-inf")]
+    # With two candidates the only gap is the whole range; there is no elbow to find
+    if len(finite) < 3:
+        return len(scores)
+    threshold = ratio * abs(finite[0])
+    if threshold <= 0:
+        return len(scores)
+    for i in range(max(min_docs, 1), len(finite)):
+        if finite[i - 1] - finite[i] >= threshold:
+            return i
+    return len(scores)
+
+
+def _truncate(index: int, doc: Dict, allowance: int, count_tokens: Callable[[str], int]) -> Tuple[Dict, int]:
+    """Shorten doc's text (on a word boundary) until its formatted form fits `allowance` tokens."""
+    text = doc["text"]
+    tokens = count_tokens(format_doc(index, doc))
+    while tokens > allowance and text:
+        keep = max(int(len(text) * allowance / tokens * 0.95), 0)
+        text = text[:keep].rsplit(" ", 1)[0] if " " in text[:keep] else text[:keep]
+        doc = {**doc, "text": text + " …", "truncated": True}
+        tokens = count_tokens(format_doc(index, doc))
+    return doc, tokens
+
+
+def format_doc(index: int, doc: Dict) -> str:
+    return f"[{index}] ({doc.get('type', 'text')} | {doc.get('source', 'unknown')} | p.{doc.get('page', 0)})\n{doc['text']}"
+
+
+def format_context(docs: List[Dict]) -> str:
+    return "\n\n".join(format_doc(i, d) for i, d in enumerate(docs, 1))
+
+
+def select_context(
+    docs: List[Dict],
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    min_score: float = CONTEXT_MIN_SCORE,
+    elbow_ratio: float = CONTEXT_ELBOW_RATIO,
+    dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> Tuple[List[Dict], Dict]:
+    """Pick, in relevance order, the docs that go into the prompt; returns (docs, stats)."""
+    count_tokens = count_tokens or _default_counter
+    ranked = sorted((d for d in docs if d.get("text", "").strip()), key=_relevance, reverse=True)
+    stats = {"candidates": len(docs), "dropped_score": 0, "dropped_duplicate": 0, "dropped_budget": 0, "truncated": 0}
+
+    above = [d for d in ranked if _relevance(d) >= min_score]
+    stats["dropped_score"] = len(ranked) - len(above)
+    keep_n = len(above)
+    if _similarity_scored(above):
+        keep_n = _elbow([_relevance(d) for d in above], CONTEXT_MIN_DOCS, elbow_ratio)
+    stats["dropped_score"] += len(above) - keep_n
+
+    kept, kept_shingles, used = [], [], 0
+    for doc in above[:keep_n]:
+        shingles = _shingles(doc["text"])
+        # Containment rather than Jaccard: an overlapping window is "mostly inside" its neighbour
+        if shingles and any(len(shingles & seen) / len(shingles) >= dedup_threshold for seen in kept_shingles):
+            stats["dropped_duplicate"] += 1
+            continue
+        tokens = count_tokens(format_doc(len(kept) + 1, doc))
+        if used + tokens > budget:
+            if len(kept) >= CONTEXT_MIN_DOCS:
+                stats["dropped_budget"] += 1
+                continue
+            # Never answer "no information" because the best chunk is long: keep it, shortened
+            allowance = (budget - used) // (CONTEXT_MIN_DOCS - len(kept))
+            doc, tokens = _truncate(len(kept) + 1, doc, allowance, count_tokens)
+            stats["truncated"] += 1
+        kept.append(doc)
+        kept_shingles.append(shingles)
+        used += tokens
+
+    stats.update(kept=len(kept), context_tokens=used, token_budget=budget)
+    return kept, stats
@@ -0,0 +1,102 @@
+"""
+Content-addressed document cache
+--------------------------------
+Maps the SHA-256 of an uploaded file to the ADE output and extracted fields
+it produced, so re-uploading a known document skips ADE, embedding and the
+Qdrant upsert entirely.
+
+Layout on disk (DOC_CACHE_DIR, default outputs/doc_cache):
+
+    <hash[:2]>/<hash>/manifest.json
+    <hash[:2]>/<hash>/ade_output.json
+    <hash[:2]>/<hash>/extracted_fields.json
+
+When the API and the ingest workers run on different hosts, DOC_CACHE_DIR
+must be on a volume they share.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import BinaryIO, Optional, Tuple, Union
+
+DOC_CACHE_DIR = os.getenv("DOC_CACHE_DIR", os.path.join("outputs", "doc_cache"))
+_HASH_BLOCK = 1024 * 1024
+
+
+def hash_upload(upload: Union[bytes, bytearray, BinaryIO]) -> str:
+    """SHA-256 of an upload, read in blocks; file-like uploads are rewound afterwards."""
+    if isinstance(upload, (bytes, bytearray)):
+        return hashlib.sha256(upload).hexdigest()
+
+    digest = hashlib.sha256()
+    upload.seek(0)
+    for block in iter(lambda: upload.read(_HASH_BLOCK), b""):
+        digest.update(block)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def artifact_dir(content_hash: str) -> str:
+    return os.path.join(DOC_CACHE_DIR, content_hash[:2], content_hash)
+
+
+def _write_json(path: str, data):
+    # Write-then-rename so readers never see a half-written artifact
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def lookup(content_hash: str) -> Optional[dict]:
+    """Return the manifest for a cached document, or None if it has never been parsed."""
+    path = os.path.join(artifact_dir(content_hash), "manifest.json")
+    if not os.path.exists(path):
+        return None
+    return _read_json(path)
+
+
+def ade_output_path(content_hash: str) -> str:
+    """Where the cached ADE output lives; streaming ingestion downloads straight to it."""
+    return os.path.join(artifact_dir(content_hash), "ade_output.json")
+
+
+def load_extracted_fields(content_hash: str) -> dict:
+    return _read_json(os.path.join(artifact_dir(content_hash), "extracted_fields.json"))
+
+
+def load_artifacts(content_hash: str) -> Tuple[dict, dict]:
+    """Load the cached (ade_output, extracted_fields) pair."""
+    return _read_json(ade_output_path(content_hash)), load_extracted_fields(content_hash)
+
+
+def store_artifacts(content_hash: str, ade_output: Optional[dict], extracted_fields: dict, **manifest) -> str:
+    """
+    Cache a document's ADE artifacts. Call before the Mongo writes, which add `_id` in place.
+    Pass ade_output=None when the output was already streamed to ade_output_path().
+    """
+    base = artifact_dir(content_hash)
+    os.makedirs(base, exist_ok=True)
+    if ade_output is not None:
+        _write_json(ade_output_path(content_hash), ade_output)
+    _write_json(os.path.join(base, "extracted_fields.json"), extracted_fields)
+    _write_json(os.path.join(base, "manifest.json"), {
+        "content_hash": content_hash,
+        "ingested": False,
+        "created_at": datetime.utcnow().isoformat(),
+        **manifest,
+    })
+    return base
+
+
+def mark_ingested(content_hash: str, **fields):
+    """Record that the cached document's chunks are embedded and stored in Qdrant."""
+    manifest = lookup(content_hash) or {"content_hash": content_hash}
+    manifest.update(fields, ingested=True, ingested_at=datetime.utcnow().isoformat())
+    _write_json(os.path.join(artifact_dir(content_hash), "manifest.json"), manifest)
@@ -1,7 +1,77 @@
-from sentence_transformers import SentenceTransformer
+import asyncio
+import json
+import logging
+import os
+
+from services.embedding_backends import load_backend
+from services.embedding_batcher import EMBED_BATCHER_ENABLED, EmbeddingBatcher
+from services.embedding_cache import get_embedding_cache, normalize_text
+from services.embedding_pool import EMBED_BATCH_SIZE, EMBED_POOL_MIN_TEXTS, get_embedding_pool
+from services.resources import register
+from services.lru_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Query-embedding cache: repeated dashboard questions skip model inference
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "4096"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_EMBED_CACHE_TTL", "3600"))
+# JSON list (or one question per line) of canned questions to embed at startup
+CANNED_QUESTIONS_FILE = os.getenv("CANNED_QUESTIONS_FILE", "")
+
+# Loaded on first use (or during app warm-up); EMBED_BACKEND picks PyTorch fp32 or ONNX Runtime
+_backend_resource = register("embedder", lambda: load_backend(MODEL_NAME))
+_query_cache = TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+_preloaded = {}
+_preloaded_hits = 0
+# Coalesces concurrent query embeddings into one forward pass; started by the app lifespan
+_query_batcher = EmbeddingBatcher(lambda texts: get_backend().encode(texts, batch_size=EMBED_BATCH_SIZE))
+
+
+def get_backend():
+    return _backend_resource.get()
+
+
+def _cache_model():
+    # Quantized vectors drift from fp32, so they get their own embedding-cache namespace
+    name = get_backend().name
+    return MODEL_NAME if name == "torch" else f"{MODEL_NAME}:{name}"
+
+
+def _encode_many(texts):
+    """
+    Bulk-encode texts: large jobs are sharded across the process pool, small ones run in-process.
+    """
+    pool = get_embedding_pool(MODEL_NAME) if len(texts) >= EMBED_POOL_MIN_TEXTS else None
+    if pool is not None:
+        return pool.encode(texts).tolist()
+    return get_backend().encode(texts, batch_size=EMBED_BATCH_SIZE).tolist()
+
+
+def encode_texts(texts):
+    """
+    Embed a list of texts, serving repeats from the persistent embedding cache
+    and running the model only on the misses.
+    """
+    cache = get_embedding_cache()
+    if cache is None or not texts:
+        return _encode_many(texts)
+
+    cache_model = _cache_model()
+    keys = [cache.key(cache_model, t) for t in texts]
+    vectors = cache.get_many(keys)
+
+    # Encode each distinct missing text once, even if it repeats within the batch
+    missing = {k: t for k, t in zip(keys, texts) if k not in vectors}
+    if missing:
+        encoded = _encode_many(list(missing.values()))
+        new_vectors = dict(zip(missing.keys(), encoded))
+        cache.put_many(cache_model, new_vectors)
+        vectors.update(new_vectors)
+
+    return [vectors[k] for k in keys]
 
-# Initialize once
-_model = SentenceTransformer("all-MiniLM-L6-v2")
 
 def embed_chunks(chunks):
     """
@@ -9,7 +79,7 @@ def embed_chunks(chunks):
     Returns the same chunks with embedding vectors added.
     """
     texts = [ch["text"] for ch in chunks]
-    embeddings = _model.encode(texts, convert_to_tensor=False).tolist()
+    embeddings = encode_texts(texts)
 
     for i, emb in enumerate(embeddings):
         chunks[i]["embedding"] = emb
@@ -18,6 +88,93 @@ def embed_chunks(chunks):
 def get_embedding(text):
     """
     Generate embedding for a single text string.
+    Served from the preloaded canned questions or the query LRU/TTL cache when possible.
+    """
+    key = normalize_text(text)
+    cached = _cached_query_embedding(key)
+    if cached is not None:
+        return cached.tolist()
+
+    if _query_batcher.can_accept_from_current_thread():
+        embedding = _query_batcher.embed_threadsafe(text)
+    else:
+        embedding = get_backend().encode([text])[0]
+    # float32 arrays keep the cache ~10x smaller than lists of Python floats
+    _query_cache.put(key, embedding)
+    return embedding.tolist()
+
+
+async def get_embedding_async(text):
+    """
+    get_embedding for async callers: cache misses join the current micro-batch.
+    """
+    key = normalize_text(text)
+    cached = _cached_query_embedding(key)
+    if cached is not None:
+        return cached.tolist()
+
+    if _query_batcher.running:
+        embedding = await _query_batcher.embed(text)
+    else:
+        embedding = (await asyncio.to_thread(get_backend().encode, [text]))[0]
+    _query_cache.put(key, embedding)
+    return embedding.tolist()
+
+
+def _cached_query_embedding(key):
+    global _preloaded_hits
+    cached = _preloaded.get(key)
+    if cached is not None:
+        _preloaded_hits += 1
+        return cached
+    return _query_cache.get(key)
+
+
+async def start_query_batcher():
+    if EMBED_BATCHER_ENABLED:
+        await _query_batcher.start()
+
+
+async def stop_query_batcher():
+    await _query_batcher.stop()
+
+
+def query_batcher_stats():
+    return _query_batcher.stats()
+
+
+def load_canned_questions(path=CANNED_QUESTIONS_FILE):
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        content = f.read()
+    try:
+        questions = json.loads(content)
+    except json.JSONDecodeError:
+        questions = content.splitlines()
+    return [q.strip() for q in questions if isinstance(q, str) and q.strip()]
+
+
+def preload_query_embeddings(questions=None):
+    """
+    Embed the canned dashboard questions in one batch; they are pinned outside the LRU.
+    """
+    questions = load_canned_questions() if questions is None else questions
+    if not questions:
+        return 0
+    vectors = get_backend().encode(questions, batch_size=EMBED_BATCH_SIZE)
+    for q, v in zip(questions, vectors):
+        _preloaded[normalize_text(q)] = v
+    logger.info(f"Preloaded embeddings for {len(questions)} canned questions.")
+    return len(questions)
+
+
+def query_cache_stats():
+    return {**_query_cache.stats(), "preloaded": len(_preloaded), "preloaded_hits": _preloaded_hits}
+
+
+def count_tokens(text):
+    """
+    Number of model tokens in `text` (without special tokens), used by the chunker's token budget.
     """
-    embedding = _model.encode(text, convert_to_tensor=False).tolist()
-    return embedding
\ No newline at end of file
+    return get_backend().count_tokens(text)
@@ -0,0 +1,236 @@
+"""
+Embedding inference backends
+----------------------------
+Pluggable CPU backends behind services/embedder.py, selected with
+EMBED_BACKEND:
+
+    torch   SentenceTransformer / PyTorch fp32 (default)
+    onnx    ONNX Runtime session over a local model directory, optionally
+            int8 dynamically quantized (EMBED_ONNX_QUANTIZE=1)
+
+Every backend exposes the same surface: encode(texts, batch_size) -> float32
+ndarray and count_tokens(text).
+
+Build the ONNX directory once, then measure what quantization costs:
+
+    python -m services.embedding_backends export --out models/all-MiniLM-L6-v2-onnx
+    python -m services.embedding_backends parity --quantize
+"""
+import argparse
+import json
+import logging
+import os
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", os.path.join("models", "all-MiniLM-L6-v2-onnx"))
+EMBED_ONNX_QUANTIZE = os.getenv("EMBED_ONNX_QUANTIZE", "0") == "1"
+EMBED_ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))  # 0 = let ONNX Runtime decide
+EMBED_MAX_SEQ_LENGTH = int(os.getenv("EMBED_MAX_SEQ_LENGTH", "256"))
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_FILE = "model_int8.onnx"
+
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.tokenizer = self.model.tokenizer
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+class OnnxBackend:
+    """
+    Mean-pooled, L2-normalized transformer outputs, which is what the
+    all-MiniLM-L6-v2 SentenceTransformer pipeline computes.
+    """
+
+    def __init__(
+        self,
+        model_dir: str = EMBED_ONNX_DIR,
+        quantize: bool = EMBED_ONNX_QUANTIZE,
+        threads: int = EMBED_ONNX_THREADS,
+        max_seq_length: int = EMBED_MAX_SEQ_LENGTH,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"No ONNX model at {model_path}; run `python -m services.embedding_backends export --out {model_dir}`"
+            )
+        if quantize:
+            model_path = quantize_onnx_model(model_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = max_seq_length
+        self.name = "onnx-int8" if quantize else "onnx"
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), batch_size):
+            batch = self.tokenizer(
+                texts[i:i + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in batch.items() if k in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+            mask = batch["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.append((pooled / norms).astype(np.float32))
+        return np.concatenate(out, axis=0) if out else np.zeros((0, 0), dtype=np.float32)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def load_backend(model_name: str, backend: Optional[str] = None, threads: Optional[int] = None):
+    """`threads` overrides EMBED_ONNX_THREADS (pool workers pin it per process)."""
+    backend = (backend or EMBED_BACKEND).lower()
+    if backend == "torch":
+        return TorchBackend(model_name)
+    if backend == "onnx":
+        return OnnxBackend(threads=EMBED_ONNX_THREADS if threads is None else threads)
+    raise ValueError(f"Unknown EMBED_BACKEND: {backend!r} (expected 'torch' or 'onnx')")
+
+
+# =====================================================
+# Model preparation
+# =====================================================
+def export_onnx(model_name: str, out_dir: str = EMBED_ONNX_DIR) -> str:
+    """Export the SentenceTransformer's transformer to ONNX alongside its tokenizer."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(out_dir, exist_ok=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0].auto_model.eval()
+    tokenizer = st.tokenizer
+    tokenizer.save_pretrained(out_dir)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    dynamic = {n: {0: "batch", 1: "sequence"} for n in names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    path = os.path.join(out_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[n] for n in names),
+            path,
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=14,
+        )
+    logger.info(f"Exported {model_name} to {path}")
+    return path
+
+
+def quantize_onnx_model(model_dir: str = EMBED_ONNX_DIR) -> str:
+    """Write (once) and return the int8 dynamically quantized copy of model.onnx."""
+    quantized_path = os.path.join(model_dir, ONNX_QUANTIZED_FILE)
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(os.path.join(model_dir, ONNX_MODEL_FILE), quantized_path, weight_type=QuantType.QInt8)
+        logger.info(f"Wrote int8 model to {quantized_path}")
+    return quantized_path
+
+
+def parity_check(reference, candidate, texts: List[str], batch_size: int = 32) -> dict:
+    """Cosine agreement between a candidate backend and the fp32 reference on the same texts."""
+    ref = reference.encode(texts, batch_size)
+    cand = candidate.encode(texts, batch_size)
+    ref = ref / np.linalg.norm(ref, axis=1, keepdims=True)
+    cand = cand / np.linalg.norm(cand, axis=1, keepdims=True)
+    cosine = (ref * cand).sum(axis=1)
+    drift = 1.0 - cosine
+    return {
+        "reference": reference.name,
+        "candidate": candidate.name,
+        "texts": len(texts),
+        "mean_cosine": round(float(cosine.mean()), 6),
+        "min_cosine": round(float(cosine.min()), 6),
+        "mean_drift": round(float(drift.mean()), 6),
+        "max_drift": round(float(drift.max()), 6),
+        "p99_drift": round(float(np.percentile(drift, 99)), 6),
+    }
+
+
+def _load_texts(path: Optional[str]) -> List[str]:
+    if path:
+        with open(path, "r") as f:
+            content = f.read()
+        try:
+            texts = json.loads(content)
+        except json.JSONDecodeError:
+            texts = content.splitlines()
+        return [t for t in texts if isinstance(t, str) and t.strip()]
+    return [
+        "What was the net profit of the company last year?",
+        "Revenue from operations grew 12% year over year.",
+        "Total current liabilities | 4,512.3 | 3,987.6",
+        "The board recommended a final dividend of Rs 8 per share.",
+        "Cash flow from operating activities declined due to working capital build-up.",
+    ]
+
+
+def main():
+    from services.embedder import MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Prepare and validate embedding backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="export the model to ONNX")
+    export.add_argument("--out", default=EMBED_ONNX_DIR)
+    export.add_argument("--quantize", action="store_true", help="also write the int8 model")
+    parity = sub.add_parser("parity", help="report cosine drift of the ONNX backend against torch fp32")
+    parity.add_argument("--model-dir", default=EMBED_ONNX_DIR)
+    parity.add_argument("--quantize", action="store_true")
+    parity.add_argument("--texts", help="JSON list or newline-separated file of sample texts")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.command == "export":
+        export_onnx(MODEL_NAME, args.out)
+        if args.quantize:
+            quantize_onnx_model(args.out)
+    else:
+        report = parity_check(
+            TorchBackend(MODEL_NAME),
+            OnnxBackend(model_dir=args.model_dir, quantize=args.quantize),
+            _load_texts(args.texts),
+        )
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Dynamic micro-batching for query embeddings
+-------------------------------------------
+Concurrent queries each need one embedding; encoding them one by one runs
+the model at batch size 1. The batcher queues incoming texts, waits at most
+EMBED_BATCH_MAX_WAIT_MS (or until EMBED_BATCH_MAX_SIZE texts are queued),
+encodes the whole batch in one call off the event loop and resolves every
+caller's future.
+
+Batch sizes, queue waits and encode times are recorded as histograms and
+exposed through stats().
+"""
+import asyncio
+import bisect
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+EMBED_BATCHER_ENABLED = os.getenv("EMBED_BATCHER_ENABLED", "1") == "1"
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+EMBED_BATCH_TIMEOUT_SECONDS = float(os.getenv("EMBED_BATCH_TIMEOUT_SECONDS", "30"))
+
+
+class Histogram:
+    """Fixed-bucket histogram; bucket i counts observations <= bounds[i] (the last is +Inf)."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.n = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.total += value
+            self.n += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [str(b) for b in self.bounds] + ["+Inf"]
+            return {
+                "buckets": dict(zip(labels, self.counts)),
+                "count": self.n,
+                "mean": round(self.total / self.n, 3) if self.n else 0.0,
+            }
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = EMBED_BATCH_MAX_SIZE,
+        max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS,
+    ):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = None
+        self._task: Optional[asyncio.Task] = None
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.wait_ms = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100])
+        self.encode_ms = Histogram([1, 2, 5, 10, 20, 50, 100, 250, 500])
+        self.requests = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Embedding batcher started (max_batch={self.max_batch_size}, max_wait={self.max_wait * 1000}ms).")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Fail anything still queued rather than leaving callers hanging
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding batcher stopped"))
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed one text as part of the next batch (call on the batcher's loop)."""
+        future = self._loop.create_future()
+        self._queue.put_nowait((text, future, time.perf_counter()))
+        self.requests += 1
+        return await future
+
+    def embed_threadsafe(self, text: str, timeout: float = EMBED_BATCH_TIMEOUT_SECONDS) -> np.ndarray:
+        """Embed from a worker thread (e.g. a sync FastAPI route) by handing the text to the loop."""
+        return asyncio.run_coroutine_threadsafe(self.embed(text), self._loop).result(timeout)
+
+    def can_accept_from_current_thread(self) -> bool:
+        # Blocking on the loop from its own thread would deadlock
+        return self.running and threading.get_ident() != self._loop_thread
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.wait_ms.observe((started - enqueued) * 1000)
+            # Identical concurrent questions are encoded once
+            texts = list(dict.fromkeys(text for text, _, _ in batch))
+            try:
+                vectors = await asyncio.to_thread(self._encode, texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.encode_ms.observe((time.perf_counter() - started) * 1000)
+            self.batch_sizes.observe(len(texts))
+            self.batches += 1
+            by_text = dict(zip(texts, np.asarray(vectors, dtype=np.float32)))
+            for text, future, _ in batch:
+                if not future.done():
+                    future.set_result(by_text[text])
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "requests": self.requests,
+            "batches": self.batches,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+            "encode_ms": self.encode_ms.snapshot(),
+        }
@@ -0,0 +1,159 @@
+"""
+Persistent embedding cache
+--------------------------
+SQLite-backed cache of chunk embeddings keyed by (model name, normalized
+text hash), so boilerplate shared across filings and re-ingested reports
+are only encoded once.
+
+- batch lookups: callers fetch every hit in one query and encode only misses
+- size-bounded: least-recently-used rows are evicted past EMBED_CACHE_MAX_MB
+- hit / miss counters live in the database, so every worker process on the
+  host contributes to (and can report) the same hit rate
+"""
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1") == "1"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join("outputs", "embedding_cache.sqlite3"))
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", "512"))
+
+_SPACE_RE = re.compile(r"\s+")
+_SQL_BATCH = 500  # stay well under SQLite's bound-parameter limit
+
+
+def normalize_text(text: str) -> str:
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_bytes: int = int(EMBED_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL,"
+                " nbytes INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO counters(name, value) VALUES (?, 0)", [("hits",), ("misses",)]
+            )
+        # Upper-bound estimate of the table size; the exact SUM only runs when it crosses the budget
+        self._approx_bytes = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Return {key: vector} for every key present; touches hits for LRU and updates counters."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            now = time.time()
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, k) for k in found]
+                )
+                self._conn.execute("UPDATE counters SET value = value + ? WHERE name = 'hits'", (len(found),))
+                self._conn.execute(
+                    "UPDATE counters SET value = value + ? WHERE name = 'misses'", (len(keys) - len(found),)
+                )
+        return found
+
+    def put_many(self, model_name: str, items: Dict[str, List[float]]):
+        """Store {key: vector} and evict least-recently-used rows if over the size budget."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, model_name, blob, len(blob), now))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings(key, model, vector, nbytes, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._approx_bytes += sum(r[3] for r in rows)
+            if self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+        self._approx_bytes = total
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% of the budget so eviction does not run on every insert
+        excess = total - int(self.max_bytes * 0.9)
+        freed = 0
+        stale = []
+        for key, nbytes in self._conn.execute("SELECT key, nbytes FROM embeddings ORDER BY last_access"):
+            stale.append((key,))
+            freed += nbytes
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+        self._approx_bytes = total - freed
+        logger.info(f"Embedding cache evicted {len(stale)} entries ({freed} bytes).")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM embeddings"
+            ).fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "size_mb": round(size / (1024 * 1024), 2),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "hit_rate": round(counters.get("hits", 0) / lookups, 4) if lookups else 0.0,
+        }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """The process-wide cache, or None when EMBED_CACHE_ENABLED=0."""
+    global _cache
+    if not EMBED_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+    return _cache
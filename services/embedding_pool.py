@@ -0,0 +1,118 @@
+"""
+Multi-process embedding pool
+----------------------------
+Shards large embedding jobs across worker processes so bulk ingestion uses
+every core instead of one. Each worker loads the configured embedding
+backend once (in its pool initializer) and encodes whole shards; results
+come back in input order.
+
+Tuning (env):
+    EMBED_POOL_WORKERS             worker processes; < 2 disables the pool
+    EMBED_POOL_THREADS_PER_WORKER  torch intra-op threads per worker
+    EMBED_BATCH_SIZE               encode() batch size inside each worker
+    EMBED_POOL_SHARD_SIZE          max texts sent to a worker per task
+    EMBED_POOL_MIN_TEXTS           smaller jobs are encoded in-process
+
+Streaming ingest embeds INGEST_STREAM_BATCH_SIZE (64) chunks at a time, so
+EMBED_POOL_MIN_TEXTS stays below that, and a job is split across every
+worker rather than into EMBED_POOL_SHARD_SIZE pieces only.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+EMBED_POOL_WORKERS = int(os.getenv("EMBED_POOL_WORKERS", "0"))
+EMBED_POOL_THREADS_PER_WORKER = int(os.getenv("EMBED_POOL_THREADS_PER_WORKER", "1"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_POOL_SHARD_SIZE = int(os.getenv("EMBED_POOL_SHARD_SIZE", "256"))
+EMBED_POOL_MIN_TEXTS = int(os.getenv("EMBED_POOL_MIN_TEXTS", "32"))
+
+# =====================================================
+# Worker-process side
+# =====================================================
+_worker_backend = None
+_worker_batch_size = EMBED_BATCH_SIZE
+
+
+def _init_worker(model_name: str, threads: int, batch_size: int):
+    global _worker_backend, _worker_batch_size
+    # Pin thread counts before torch spins up its pools, so N workers don't oversubscribe the cores
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    from services.embedding_backends import load_backend
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    # Passed explicitly: under spawn, embedding_backends was already imported (with the
+    # parent's EMBED_ONNX_THREADS) by the time this initializer runs
+    _worker_backend = load_backend(model_name, threads=threads)
+    _worker_batch_size = batch_size
+
+
+def _encode_shard(texts: List[str]) -> np.ndarray:
+    return _worker_backend.encode(texts, batch_size=_worker_batch_size)
+
+
+# =====================================================
+# Parent-process side
+# =====================================================
+class EmbeddingPool:
+    def __init__(
+        self,
+        model_name: str,
+        workers: int = EMBED_POOL_WORKERS,
+        threads_per_worker: int = EMBED_POOL_THREADS_PER_WORKER,
+        batch_size: int = EMBED_BATCH_SIZE,
+        shard_size: int = EMBED_POOL_SHARD_SIZE,
+    ):
+        self.workers = workers
+        self.shard_size = shard_size
+        # spawn, not fork: forking a process that already holds torch thread pools can deadlock
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, threads_per_worker, batch_size),
+        )
+        logger.info(f"Embedding pool started: {workers} workers x {threads_per_worker} threads.")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode `texts` across the pool; row i of the result is the embedding of texts[i]."""
+        # At least one shard per worker: a 64-chunk streaming batch is split 4 ways, not sent whole to one
+        size = max(1, min(self.shard_size, -(-len(texts) // self.workers)))
+        shards = [texts[i:i + size] for i in range(0, len(texts), size)]
+        # Executor.map yields results in submission order, whatever order the workers finish in
+        return np.concatenate(list(self._executor.map(_encode_shard, shards)), axis=0)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool: Optional[EmbeddingPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_embedding_pool(model_name: str) -> Optional[EmbeddingPool]:
+    """The process-wide pool, or None when EMBED_POOL_WORKERS < 2."""
+    global _pool
+    if EMBED_POOL_WORKERS < 2:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = EmbeddingPool(model_name)
+            atexit.register(_pool.shutdown)
+    return _pool
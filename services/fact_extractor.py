@@ -0,0 +1,270 @@
+"""
+Numeric fact extraction
+-----------------------
+Pulls (metric, period, value, unit, scale) facts out of ADE output at
+ingest time, for the columnar fact index (services/fact_store.py):
+
+- table chunks: a header row of periods ("2024 | 2023", "March 31, 2024 | ...",
+  "FY 2024-25") followed by label rows with one number per period. Rows
+  whose numbers do not line up with the periods are skipped rather than
+  guessed. "(1,234)" is negative, "—" is a missing value.
+- schema extraction (ade_extracted_fields): every numeric leaf, e.g.
+  balance_sheet.equity.total_equity = "5,43,087 crore", for the report's
+  fiscal_year.
+
+Scale ("in millions", "₹ in crore", ...) and currency come from the table
+caption or the text just before the table. Values are kept as reported;
+value * scale is the absolute amount.
+"""
+import re
+from typing import Iterable, List, Optional, Tuple
+
+_ROW_RE = re.compile(r"<tr[^>]*>(.*?)</tr\s*>", re.S | re.I)
+_CELL_RE = re.compile(r"<t[dh][^>]*>(.*?)</t[dh]\s*>", re.S | re.I)
+_TABLE_RE = re.compile(r"<table.*?</table\s*>", re.S | re.I)
+_TAG_RE = re.compile(r"<[^>]+>|<::.*?::>|<!--.*?-->", re.S)
+_SPACE_RE = re.compile(r"\s+")
+_NUMBER_RE = re.compile(r"\d[\d,]*(?:\.\d+)?|\.\d+")
+_FOOTNOTE_RE = re.compile(r"\(\d\)|\[\d+\]|\*+$")
+_YEAR_RE = re.compile(r"\b(19\d{2}|20\d{2})(?:\s*[-–/]\s*(\d{2,4}))?\b")
+_PERIOD_RE = re.compile(
+    r"^(?:(?:fy|fiscal(?: year)?|year ended|years ended|as (?:of|at)|quarter ended|three months ended)\s*)?"
+    r"(?:[a-z]+\.?\s+\d{1,2},?\s+)?(?:19|20)\d{2}(?:\s*[-–/]\s*\d{2,4})?$",
+    re.I,
+)
+_EMPTY_CELLS = {"", "$", "₹", "€", "£", "rs", "rs.", "inr", "usd"}
+_MISSING_CELLS = {"—", "–", "-", "n/a", "na", "nm", "not applicable"}
+
+SCALES = {"thousand": 1e3, "million": 1e6, "billion": 1e9, "lakh": 1e5, "crore": 1e7}
+_SCALE_IN_RE = re.compile(r"\bin\s+(?:[$₹€£]\s*|rs\.?\s*|inr\s*|usd\s*)?(thousand|million|billion|lakh|crore)s?\b", re.I)
+_SCALE_WORD_RE = re.compile(r"\b(thousand|million|billion|lakh|crore)s?\b", re.I)
+MAX_LABEL_LENGTH = 80
+
+
+def metric_key(label: str) -> str:
+    """'Total Revenues (1)' -> 'total_revenues', the same shape as the extraction schema keys."""
+    label = _FOOTNOTE_RE.sub("", label.lower()).replace("&", " and ")
+    return re.sub(r"[^a-z0-9]+", "_", label).strip("_")
+
+
+def parse_period(text: str) -> Optional[Tuple[str, int]]:
+    """(period label, year) for a header cell such as 'December 31, 2024' or 'FY 2024-25'; None otherwise."""
+    text = _SPACE_RE.sub(" ", text).strip().rstrip(":")
+    if not text or not _PERIOD_RE.match(text):
+        return None
+    match = list(_YEAR_RE.finditer(text))[-1]
+    year = int(match.group(1))
+    if match.group(2):
+        # "2024-25": the fiscal year ends in the second year
+        end = match.group(2)
+        year = int(end) if len(end) == 4 else (year // 100) * 100 + int(end)
+    return text, year
+
+
+def _period_from_fields(fields: dict) -> Optional[Tuple[str, int]]:
+    for key in ("fiscal_year", "report_date", "period"):
+        value = str(fields.get(key) or "")
+        matches = list(_YEAR_RE.finditer(value))
+        if matches:
+            return parse_period(value) or (value, int(matches[-1].group(1)))
+    return None
+
+
+def parse_amount(text: str) -> Optional[Tuple[float, bool]]:
+    """(value, is_percent) for a numeric cell like '$ 1,076', '(141)', '12.5%'; None if not a number."""
+    s = _SPACE_RE.sub("", text).lower()
+    for symbol in ("$", "₹", "€", "£", "rs.", "inr", "usd"):
+        s = s.replace(symbol, "")
+    negative = (s.startswith("(") and s.endswith(")")) or s.startswith("-") or s.startswith("−")
+    s = s.strip("()-−")
+    percent = s.endswith("%")
+    s = s.rstrip("%")
+    if not s or not _NUMBER_RE.fullmatch(s):
+        return None
+    value = float(s.replace(",", ""))
+    return (-value if negative else value), percent
+
+
+def detect_scale(text: str) -> Tuple[float, str]:
+    """(scale, scale word) from a caption such as '(in millions)' or '₹ in crore'."""
+    match = _SCALE_IN_RE.search(text) or _SCALE_WORD_RE.search(text)
+    if not match:
+        return 1.0, ""
+    word = match.group(1).lower()
+    return SCALES[word], word
+
+
+def detect_currency(text: str) -> str:
+    lowered = text.lower()
+    if "₹" in text or re.search(r"\b(?:rs\.?|inr|crores?|lakhs?)\b", lowered):
+        return "INR"
+    if "$" in text or "usd" in lowered:
+        return "USD"
+    if "€" in text or "eur" in lowered:
+        return "EUR"
+    if "£" in text or "gbp" in lowered:
+        return "GBP"
+    return ""
+
+
+def _clean_cell(html: str) -> str:
+    return _SPACE_RE.sub(" ", _TAG_RE.sub(" ", html)).strip()
+
+
+def _table_rows(markup: str) -> List[List[str]]:
+    rows = [[_clean_cell(c) for c in _CELL_RE.findall(row)] for row in _ROW_RE.findall(markup)]
+    if rows:
+        return rows
+    # Markdown / pipe tables
+    return [[c.strip() for c in line.strip().strip("|").split("|")] for line in markup.splitlines() if "|" in line]
+
+
+def extract_table_facts(markup: str, context: str = "") -> List[dict]:
+    """Facts from one ADE table; `context` is the text around it (caption, preceding paragraph)."""
+    caption = _clean_cell(_TABLE_RE.sub(" ", markup))
+    scale_text = f"{context} {caption}"
+    scale, _ = detect_scale(scale_text)
+    currency = detect_currency(f"{scale_text} {markup[:2000]}")
+
+    facts, periods = [], None
+    for cells in _table_rows(markup):
+        cells = [c for c in cells if c.lower() not in _EMPTY_CELLS]
+        if not cells:
+            continue
+        parsed = [parse_period(c) for c in cells]
+        if parsed[0] is None and len(cells) > 1 and all(parsed[1:]):
+            periods = parsed[1:]
+            continue
+        if all(parsed):
+            periods = parsed
+            continue
+        if periods is None or parse_amount(cells[0]) is not None:
+            continue
+
+        label = cells[0]
+        values = []
+        for cell in cells[1:]:
+            if cell.lower() in _MISSING_CELLS:
+                values.append(None)
+                continue
+            amount = parse_amount(cell)
+            if amount is None:
+                break
+            values.append(amount)
+        # A row that does not line up with the header (merged columns, sub-columns) is not guessed at
+        if len(values) != len(periods) or len(label) > MAX_LABEL_LENGTH:
+            continue
+        metric = metric_key(label)
+        if not metric:
+            continue
+        per_share = "per share" in label.lower()
+        for (period, year), amount in zip(periods, values):
+            if amount is None:
+                continue
+            value, percent = amount
+            facts.append({
+                "metric": metric,
+                "label": label,
+                "period": period,
+                "year": year,
+                "value": value,
+                "unit": "%" if percent else currency,
+                "scale": 1.0 if percent or per_share else scale,
+            })
+    return facts
+
+
+class TableFactExtractor:
+    """Feed ADE `chunks` items one at a time (e.g. from the streaming reader); facts accumulate in .facts."""
+
+    def __init__(self):
+        self.facts: List[dict] = []
+        self._last_text = ""
+
+    def feed(self, item: dict):
+        chunk_type = item.get("chunk_type") or item.get("type") or "text"
+        markup = item.get("markdown") or item.get("text") or ""
+        if chunk_type != "table":
+            if chunk_type != "marginalia":
+                # Captions like "(in millions)" usually sit right before the table
+                self._last_text = markup[-300:]
+            return
+        grounding = item.get("grounding") or [{}]
+        if isinstance(grounding, dict):
+            grounding = [grounding]
+        page = (grounding[0] or {}).get("page", 0) if grounding else 0
+        for fact in extract_table_facts(markup, self._last_text):
+            fact.update(source="table", chunk_id=item.get("chunk_id") or "", page=page or 0)
+            self.facts.append(fact)
+
+
+def extract_ade_facts(ade_items: Iterable[dict]) -> List[dict]:
+    extractor = TableFactExtractor()
+    for item in ade_items or []:
+        extractor.feed(item)
+    return extractor.facts
+
+
+def _leaves(node, path=()) -> Iterable[Tuple[Tuple[str, ...], object]]:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from _leaves(value, path + (str(key),))
+    elif not isinstance(node, list):
+        yield path, node
+
+
+def parse_field_value(raw) -> Optional[Tuple[float, bool, float, str]]:
+    """(value, is_percent, scale, currency) for an extracted field like '10,71,174 crore' or '$96.8 billion'."""
+    if isinstance(raw, bool) or raw is None:
+        return None
+    if isinstance(raw, (int, float)):
+        return float(raw), False, 1.0, ""
+    text = str(raw).strip()
+    # One number per field: skip dates, ranges and free text
+    if len(_NUMBER_RE.findall(text)) != 1 or _YEAR_RE.fullmatch(text):
+        return None
+    amount = parse_amount(re.sub(r"[A-Za-z\s]+$", "", text))
+    if amount is None:
+        return None
+    scale, _ = detect_scale(text)
+    return amount[0], amount[1], scale, detect_currency(text)
+
+
+def extraction_period(extracted_fields: dict) -> Optional[Tuple[str, int]]:
+    """(period label, year) the schema extraction reports on, from fiscal_year / report_date."""
+    fields = (extracted_fields or {}).get("extraction") or extracted_fields or {}
+    return _period_from_fields(fields) if isinstance(fields, dict) else None
+
+
+def extract_field_facts(extracted_fields: dict) -> List[dict]:
+    """Facts from the schema extraction (the document saved to ade_extracted_fields)."""
+    fields = (extracted_fields or {}).get("extraction") or extracted_fields or {}
+    if not isinstance(fields, dict):
+        return []
+    period = _period_from_fields(fields)
+    if period is None:
+        return []
+
+    facts, seen = [], set()
+    for path, raw in _leaves(fields):
+        parsed = parse_field_value(raw)
+        if parsed is None:
+            continue
+        metric = metric_key(path[-1])
+        if metric in seen:
+            continue
+        seen.add(metric)
+        value, percent, scale, currency = parsed
+        facts.append({
+            "metric": metric,
+            "label": ".".join(path),
+            "period": period[0],
+            "year": period[1],
+            "value": value,
+            "unit": "%" if percent else currency,
+            "scale": scale,
+            "source": "extraction",
+            "chunk_id": "",
+            "page": 0,
+        })
+    return facts
@@ -0,0 +1,241 @@
+"""
+Columnar fact index
+-------------------
+Numeric facts extracted at ingest (services/fact_extractor.py), stored per
+company as NumPy column arrays so charts and ratio questions read a series
+directly instead of asking the LLM and regex-scraping its prose.
+
+Layout on disk (FACT_STORE_DIR, default outputs/fact_store):
+
+    <company slug>.npz    one array per column, rows sorted by (metric, year, period)
+
+Columns: metric, label, period, year, value, unit, scale, source, doc_id,
+chunk_id, page. `value` is as reported; value * scale is the absolute
+amount. Re-ingesting a document replaces its rows (keyed by doc_id).
+
+Readers keep each company's columns in memory with a metric -> row-range
+index and reload a file when its mtime changes, so facts written by the
+ingest workers show up in the API processes without a restart. When the
+API and the ingest workers run on different hosts, FACT_STORE_DIR must be
+on a volume they share.
+"""
+import contextlib
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from services.mongo_store import normalize_company_name
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+FACT_INDEX_ENABLED = os.getenv("FACT_INDEX_ENABLED", "1") == "1"
+FACT_STORE_DIR = os.getenv("FACT_STORE_DIR", os.path.join("outputs", "fact_store"))
+
+STRING_COLUMNS = ("metric", "label", "period", "unit", "source", "doc_id", "chunk_id")
+COLUMNS = {
+    **{name: str for name in STRING_COLUMNS},
+    "year": np.int32,
+    "page": np.int32,
+    "value": np.float64,
+    "scale": np.float64,
+}
+
+# Words that do not have to appear in a question for a metric to match it
+_OPTIONAL_METRIC_WORDS = {"total", "consolidated", "of", "and", "the", "for", "from", "in", "to"}
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _slug(company_key: str) -> str:
+    return re.sub(r"[^A-Z0-9]+", "_", company_key).strip("_") or "UNKNOWN"
+
+
+def _path(root: str, company_key: str) -> str:
+    return os.path.join(root, f"{_slug(company_key)}.npz")
+
+
+def _to_columns(facts: List[dict], doc_id: str) -> Dict[str, np.ndarray]:
+    columns = {}
+    for name, dtype in COLUMNS.items():
+        values = [doc_id if name == "doc_id" else fact.get(name, "" if dtype is str else 0) for fact in facts]
+        columns[name] = np.array(values, dtype=dtype)
+    return columns
+
+
+def _read(path: str) -> Optional[Dict[str, np.ndarray]]:
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in COLUMNS}
+
+
+def _write(path: str, columns: Dict[str, np.ndarray]):
+    # Write-then-rename so readers never see a half-written file
+    tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+    np.savez(tmp_path, **columns)
+    os.replace(tmp_path, path)
+
+
+@contextlib.contextmanager
+def _locked(path: str):
+    """Serialize writers of one company file across ingest worker processes."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _stem(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+class CompanyFacts:
+    """One company's fact columns, sorted by metric, with a metric -> row-range index."""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+        metrics, starts, counts = np.unique(columns["metric"], return_index=True, return_counts=True)
+        self.index = {m: (s, s + c) for m, s, c in zip(metrics.tolist(), starts.tolist(), counts.tolist())}
+
+    def __len__(self):
+        return len(self.columns["metric"])
+
+    def rows(self, metric: str) -> Dict[str, np.ndarray]:
+        start, end = self.index.get(metric, (0, 0))
+        return {name: column[start:end] for name, column in self.columns.items()}
+
+    def series(self, metric: str) -> List[dict]:
+        """One fact per year for `metric`, oldest first, in one unit and scale.
+
+        The table (or extraction) covering the most years sets the unit and
+        scale; other sources only fill years it does not have.
+        """
+        rows = self.rows(metric)
+        n = len(rows["metric"])
+        if not n:
+            return []
+        records = [{name: rows[name][i].item() for name in COLUMNS} for i in range(n)]
+        coverage = Counter(r["chunk_id"] or r["doc_id"] for r in records)
+        records.sort(key=lambda r: -coverage[r["chunk_id"] or r["doc_id"]])
+        primary = records[0]
+        by_year = {}
+        for r in records:
+            if (r["unit"], r["scale"]) == (primary["unit"], primary["scale"]):
+                by_year.setdefault(r["year"], r)
+        return [by_year[year] for year in sorted(by_year)]
+
+    def match_metric(self, text: str) -> Optional[str]:
+        """The metric named in `text`, e.g. 'revenue trend' -> 'total_revenue'; the most specific wins."""
+        words = {_stem(w) for w in _WORD_RE.findall(text.lower())}
+        best, best_key = None, None
+        for metric, (start, end) in self.index.items():
+            metric_words = [_stem(w) for w in metric.split("_") if w]
+            required = [w for w in metric_words if w not in _OPTIONAL_METRIC_WORDS]
+            if not required or not all(w in words for w in required):
+                continue
+            # More matched words first, then totals over line items, the longest series, the shorter name
+            key = (sum(w in words for w in metric_words), "total" in metric_words, end - start, -len(metric))
+            if best_key is None or key > best_key:
+                best, best_key = metric, key
+        return best
+
+
+class FactIndex:
+    def __init__(self, root: str = FACT_STORE_DIR):
+        self.root = root
+        self._companies: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def add(self, company: str, facts: Iterable[dict], doc_id: str) -> int:
+        """Replace `doc_id`'s facts for `company`; returns the number of rows written."""
+        facts = list(facts)
+        company_key = normalize_company_name(company)
+        os.makedirs(self.root, exist_ok=True)
+        path = _path(self.root, company_key)
+        with _locked(path):
+            new = _to_columns(facts, doc_id)
+            existing = _read(path)
+            if existing is not None:
+                keep = existing["doc_id"] != doc_id
+                new = {name: np.concatenate([existing[name][keep], new[name]]) for name in COLUMNS}
+            order = np.lexsort((new["period"], new["year"], new["metric"]))
+            _write(path, {name: column[order] for name, column in new.items()})
+        logger.info(f"Indexed {len(facts)} facts for {company_key} (doc {doc_id[:12]}).")
+        return len(facts)
+
+    def get(self, company: str) -> Optional[CompanyFacts]:
+        company_key = normalize_company_name(company)
+        path = _path(self.root, company_key)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._companies.get(company_key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with self._lock:
+            facts = CompanyFacts(_read(path))
+            self._companies[company_key] = (mtime, facts)
+        return facts
+
+    def series(self, company: str, metric: str) -> List[dict]:
+        facts = self.get(company)
+        return facts.series(metric) if facts is not None else []
+
+    def first_series(self, company: str, metrics: Iterable[str]) -> List[dict]:
+        """The series of the first metric in `metrics` the company has facts for."""
+        facts = self.get(company)
+        for metric in metrics if facts is not None else ():
+            series = facts.series(metric)
+            if series:
+                return series
+        return []
+
+    def stats(self) -> dict:
+        return {
+            "enabled": FACT_INDEX_ENABLED,
+            "root": self.root,
+            "loaded_companies": len(self._companies),
+            "loaded_facts": sum(len(facts) for _, facts in self._companies.values()),
+        }
+
+
+_index = FactIndex()
+
+
+def get_fact_index() -> Optional[FactIndex]:
+    """The process-wide index, or None when FACT_INDEX_ENABLED=0."""
+    return _index if FACT_INDEX_ENABLED else None
+
+
+def index_facts(company: str, facts: Iterable[dict], doc_id: str) -> int:
+    """Ingest-side entry point; a failure is logged, never fails the ingest job."""
+    index = get_fact_index()
+    if index is None or not company or company == "Unknown":
+        return 0
+    try:
+        return index.add(company, facts, doc_id)
+    except Exception as e:
+        logger.warning(f"Fact indexing failed for {company}: {e}")
+        return 0
+
+
+def fact_index_stats() -> dict:
+    return _index.stats()
@@ -0,0 +1,263 @@
+"""
+ADE ingest worker
+-----------------
+Standalone process that drains the durable `ade_jobs` queue.
+
+Run one or more per host, on as many hosts as needed:
+
+    python -m services.ingest_worker --concurrency 4
+
+Jobs arrive here once the central poller (services/ade_poller.py) has
+seen ADE finish parsing them. Each worker claims jobs under a lease, keeps
+the lease alive with heartbeats while it runs the fetch → extract →
+preprocess → embed → store stages, and hands unfinished jobs back to the queue on shutdown. Jobs held
+by a crashed worker are picked up again once their lease expires.
+
+It reads .env itself (the API does so through the agent module), so
+VISION_AGENT_API_KEY must be in its environment or .env: POST /load_api_key
+only sets the key in the API process.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import tempfile
+import uuid
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+# Before the services below read their configuration from the environment
+load_dotenv()
+
+from services import doc_cache, job_queue
+from services.ade_client import (
+    ADEError,
+    Status_landingai_ade_jobs,
+    get_landingai_ade_output,
+    download_landingai_ade_output,
+    extract_fields_from_ade_output,
+    close_ade_client,
+)
+from services.ingestion import (
+    company_from_ade_output,
+    store_ade_output,
+    store_ade_output_streaming,
+    store_report,
+)
+from services.streaming_ingest import read_ade_field
+from services.mongo_store import get_db
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+WORKER_CONCURRENCY = int(os.getenv("INGEST_WORKER_CONCURRENCY", "2"))
+IDLE_POLL_SECONDS = float(os.getenv("INGEST_IDLE_POLL_SECONDS", "2"))
+HEARTBEAT_SECONDS = float(os.getenv("INGEST_HEARTBEAT_SECONDS", str(job_queue.LEASE_SECONDS / 4)))
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("INGEST_SHUTDOWN_GRACE_SECONDS", "30"))
+STREAMING_INGEST = os.getenv("INGEST_STREAMING", "0") == "1"
+
+
+class NotParsedYet(Exception):
+    """The job reached the ingest queue before ADE finished parsing it."""
+
+
+async def _fetch_ade_output(job: dict, dest_path: str = None):
+    """
+    Fetch the ADE output using the URL recorded by the poller, refreshing it once if stale.
+    With `dest_path` the output is streamed to disk instead of being loaded.
+    """
+    async def fetch(url):
+        if dest_path:
+            return await download_landingai_ade_output(url, dest_path)
+        return await get_landingai_ade_output(url)
+
+    output_url = job.get("output_url")
+    if output_url:
+        try:
+            return await fetch(output_url)
+        except ADEError as e:
+            logger.warning(f"Stored output URL for job {job['job_id']} failed ({e}); refreshing it.")
+
+    status = await Status_landingai_ade_jobs(job["job_id"])
+    if status.get("status") != "completed":
+        raise NotParsedYet(status.get("status"))
+    return await fetch(status.get("output_url"))
+
+
+async def _ingest_in_memory(job: dict, content_hash: str, manifest: dict) -> str:
+    job_id = job["job_id"]
+    if manifest:
+        ade_output, extracted_fields = await asyncio.to_thread(doc_cache.load_artifacts, content_hash)
+    else:
+        ade_output = await _fetch_ade_output(job)
+        extracted_fields = await extract_fields_from_ade_output(ade_output)
+    company_name = company_from_ade_output(ade_output, extracted_fields)
+
+    if content_hash and not manifest:
+        await asyncio.to_thread(
+            doc_cache.store_artifacts, content_hash, ade_output, extracted_fields,
+            job_id=job_id, filename=job.get("filename"), company_name=company_name,
+        )
+
+    # CPU / blocking I/O stages run off the event loop so heartbeats keep flowing
+    await asyncio.to_thread(store_ade_output, job_id, ade_output, extracted_fields, content_hash)
+    return company_name
+
+
+async def _ingest_streaming(job: dict, content_hash: str, manifest: dict) -> str:
+    job_id = job["job_id"]
+    if content_hash:
+        path = doc_cache.ade_output_path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    else:
+        path = os.path.join(tempfile.gettempdir(), f"{job_id}.ade.json")
+
+    if manifest:
+        extracted_fields = await asyncio.to_thread(doc_cache.load_extracted_fields, content_hash)
+    else:
+        await _fetch_ade_output(job, dest_path=path)
+        markdown = await asyncio.to_thread(read_ade_field, path, "markdown")
+        extracted_fields = await extract_fields_from_ade_output({"markdown": markdown})
+
+    embedded_extraction = await asyncio.to_thread(read_ade_field, path, "extraction")
+    company_name = company_from_ade_output({"extraction": embedded_extraction}, extracted_fields)
+
+    if content_hash and not manifest:
+        await asyncio.to_thread(
+            doc_cache.store_artifacts, content_hash, None, extracted_fields,
+            job_id=job_id, filename=job.get("filename"), company_name=company_name,
+        )
+
+    try:
+        await asyncio.to_thread(store_ade_output_streaming, job_id, path, extracted_fields, company_name, content_hash)
+    finally:
+        if not content_hash and os.path.exists(path):
+            os.remove(path)
+    return company_name
+
+
+async def run_job(job: dict) -> dict:
+    """Fetch → extract → preprocess → embed → store for one claimed, already-parsed job."""
+    content_hash = job.get("content_hash")
+    manifest = await asyncio.to_thread(doc_cache.lookup, content_hash) if content_hash else None
+
+    if manifest and manifest.get("ingested"):
+        # Known document: its chunks are already in Qdrant
+        company_name = manifest.get("company_name", "Unknown")
+    else:
+        ingest = _ingest_streaming if STREAMING_INGEST else _ingest_in_memory
+        company_name = await ingest(job, content_hash, manifest)
+        if content_hash:
+            await asyncio.to_thread(doc_cache.mark_ingested, content_hash)
+
+    if job.get("report_id"):
+        report_data = await asyncio.to_thread(get_db()["annual_reports"].find_one, {"_id": ObjectId(job["report_id"])})
+        if report_data:
+            await asyncio.to_thread(store_report, report_data, company_name, job.get("report_filename"))
+
+    return {"cache_path": doc_cache.artifact_dir(content_hash)} if content_hash else {}
+
+
+class IngestWorker:
+    def __init__(self, concurrency: int = WORKER_CONCURRENCY, worker_id: str = None):
+        self.concurrency = concurrency
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._slots = asyncio.Semaphore(concurrency)
+        self._stopping = asyncio.Event()
+        self._tasks = set()
+
+    def stop(self):
+        logger.info(f"Worker {self.worker_id} stopping; no new jobs will be claimed.")
+        self._stopping.set()
+
+    async def _heartbeat(self, job_id: str, job_task: asyncio.Task):
+        while not job_task.done():
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            owned = await asyncio.to_thread(job_queue.heartbeat, job_id, self.worker_id)
+            if not owned:
+                logger.warning(f"Lease on job {job_id} lost; abandoning it.")
+                job_task.cancel(msg="lease lost")
+                return
+
+    async def _process(self, job: dict):
+        job_id = job["job_id"]
+        try:
+            if job.get("attempts", 1) > job_queue.MAX_ATTEMPTS:
+                await asyncio.to_thread(
+                    job_queue.fail_job, job_id, self.worker_id, "exceeded max attempts", job["attempts"]
+                )
+                return
+
+            job_task = asyncio.create_task(run_job(job))
+            beat = asyncio.create_task(self._heartbeat(job_id, job_task))
+            try:
+                result = await job_task
+            finally:
+                beat.cancel()
+
+            await asyncio.to_thread(job_queue.complete_job, job_id, self.worker_id, **result)
+
+        except NotParsedYet as e:
+            logger.info(f"ADE job {job_id} still {e}; returning it to the poller.")
+            await asyncio.to_thread(job_queue.defer_job, job_id, self.worker_id)
+        except asyncio.CancelledError:
+            if self._stopping.is_set():
+                await asyncio.to_thread(job_queue.release_job, job_id, self.worker_id)
+        except Exception as e:
+            logger.exception(f"⚠️ Error in ADE ingest job {job_id}: {e}")
+            await asyncio.to_thread(job_queue.fail_job, job_id, self.worker_id, str(e), job.get("attempts", 1))
+        finally:
+            self._slots.release()
+
+    async def run(self):
+        await asyncio.to_thread(job_queue.ensure_queue_indexes)
+        logger.info(f"Worker {self.worker_id} started with concurrency {self.concurrency}.")
+
+        while not self._stopping.is_set():
+            await self._slots.acquire()
+            if self._stopping.is_set():
+                self._slots.release()
+                break
+            job = await asyncio.to_thread(job_queue.claim_job, self.worker_id)
+            if job is None:
+                self._slots.release()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=IDLE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logger.info(f"Worker {self.worker_id} claimed job {job['job_id']} (attempt {job.get('attempts')}).")
+            task = asyncio.create_task(self._process(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        # Let in-flight jobs finish, then hand the rest back so another worker resumes them
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=SHUTDOWN_GRACE_SECONDS)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await close_ade_client()
+
+
+async def _main(concurrency: int):
+    worker = IngestWorker(concurrency=concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Drain the durable ADE ingestion queue.")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY,
+                        help="Maximum number of jobs this process works on at once.")
+    args = parser.parse_args()
+    asyncio.run(_main(args.concurrency))
@@ -0,0 +1,109 @@
+"""
+ADE ingestion stages
+--------------------
+Synchronous preprocess → embed → store stages shared by the ingest worker.
+Everything here is blocking CPU / I/O work; async callers should run it
+off the event loop (asyncio.to_thread).
+"""
+import hashlib
+import json
+import logging
+import os
+
+from services.preprocessor import preprocess_ade_json
+from services.chunker import StructuredChunker
+from services.embedder import embed_chunks
+from services.embedding_cache import get_embedding_cache
+from services.vector_store import chunk_store
+from services.mongo_store import save_document
+from services.streaming_ingest import stream_ingest_ade_file
+from services.fact_extractor import TableFactExtractor, extract_ade_facts, extract_field_facts
+from services.fact_store import index_facts
+from services.doc_cache import DOC_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def company_from_ade_output(ade_output: dict, extracted_fields: dict = None) -> str:
+    """Best-effort company name: the schema extraction first, then the parse output's own block."""
+    for doc in (extracted_fields, ade_output):
+        name = ((doc or {}).get("extraction") or {}).get("company_name")
+        if name:
+            return name
+    return "Unknown"
+
+
+def content_id(data) -> str:
+    """Stable hash of parsed content, the Qdrant doc_id when no upload hash is available."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _log_embedding_cache():
+    cache = get_embedding_cache()
+    if cache is not None:
+        logger.info(f"Embedding cache: {cache.stats()}")
+
+
+def store_ade_output(job_id: str, ade_output: dict, extracted_fields: dict, doc_id: str = None):
+    """Persist the raw ADE output and extracted fields, then embed & index its chunks."""
+    # Hash before save_document adds _id / created_at in place
+    doc_id = doc_id or content_id(ade_output.get("chunks") or ade_output.get("markdown"))
+    save_document(ade_output, collection="ade_raw_outputs")
+    save_document(extracted_fields, collection="ade_extracted_fields")
+
+    company_name = company_from_ade_output(ade_output, extracted_fields)
+    fields = extract_field_facts(extracted_fields) or extract_field_facts(ade_output)
+    facts = extract_ade_facts(ade_output.get("chunks")) + fields
+    index_facts(company_name, facts, doc_id)
+
+    processed_chunks = preprocess_ade_json(ade_output)
+    for ch in processed_chunks:
+        ch["metadata"]["CompanyName"] = company_name
+    embedded_ade_chunks = embed_chunks(processed_chunks)
+    result = chunk_store(embedded_ade_chunks, doc_id=doc_id)
+
+    print(f"✅ ADE job {job_id} parsed & stored successfully.")
+    _log_embedding_cache()
+    return result
+
+
+def _in_doc_cache(path: str) -> bool:
+    cache_dir = os.path.abspath(DOC_CACHE_DIR)
+    return os.path.commonpath([os.path.abspath(path), cache_dir]) == cache_dir
+
+
+def store_ade_output_streaming(job_id: str, ade_output_path: str, extracted_fields: dict, company_name: str,
+                               doc_id: str = None):
+    """Like store_ade_output, but chunks / embeds / upserts the on-disk ADE output in bounded batches."""
+    # The raw output can be far larger than a Mongo document allows; keep a pointer instead,
+    # but only to the doc cache: any other path is a temp file the caller deletes after ingest
+    raw = {"job_id": job_id, "streamed": True}
+    if _in_doc_cache(ade_output_path):
+        raw["output_path"] = ade_output_path
+    save_document(raw, collection="ade_raw_outputs")
+    save_document(extracted_fields, collection="ade_extracted_fields")
+
+    # Table facts are collected as the reader passes each item, without a second read of the file
+    tables = TableFactExtractor()
+    result = stream_ingest_ade_file(ade_output_path, company_name, doc_id=doc_id, on_item=tables.feed)
+    index_facts(company_name, tables.facts + extract_field_facts(extracted_fields), doc_id or job_id)
+    print(f"✅ ADE job {job_id} streamed & stored successfully.")
+    _log_embedding_cache()
+    return result
+
+
+def store_report(report_data: dict, company_name: str, source: str = None):
+    """Embed & index the chunks of an annual-report ADE JSON uploaded alongside the document."""
+    report_chunks = list(StructuredChunker().iter_chunks(
+        report_data.get("chunks", []),
+        company_name,
+        source=report_data.get("metadata", {}).get("filename", source),
+    ))
+
+    doc_id = content_id(report_data.get("chunks", []))
+    index_facts(company_name, extract_ade_facts(report_data.get("chunks", [])), doc_id)
+
+    embedded_report = embed_chunks(report_chunks)
+    result = chunk_store(embedded_report, doc_id=doc_id)
+    print(f"✅ Stored {len(embedded_report)} report chunks for {company_name}")
+    return result
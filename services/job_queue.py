@@ -0,0 +1,212 @@
+"""
+Durable ADE job queue
+---------------------
+A lease-based work queue on top of the Mongo `ade_jobs` collection.
+
+Each job is one document keyed by `job_id`. Workers claim jobs atomically
+with find_one_and_update, hold them under a time-limited lease that they
+keep alive with heartbeats, and release them on completion or failure.
+A job whose worker died simply has its lease expire and is re-claimed by
+another worker, so nothing is lost across restarts.
+
+Job states: pending → queued → running → completed | failed | error
+
+`pending` jobs are still being parsed by ADE; the central poller
+(services/ade_poller.py) moves them to `queued` once ADE finishes.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+from services.mongo_store import get_db
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+JOBS_COLLECTION = "ade_jobs"
+LEASE_SECONDS = int(os.getenv("INGEST_LEASE_SECONDS", "120"))
+MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+STATUS_PENDING = "pending"
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_ERROR = "error"
+
+
+def _jobs():
+    return get_db()[JOBS_COLLECTION]
+
+
+def ensure_queue_indexes():
+    """Create the indexes claim/heartbeat rely on (idempotent)."""
+    _jobs().create_index([("job_id", ASCENDING)])
+    _jobs().create_index([("content_hash", ASCENDING)], sparse=True)
+    _jobs().create_index([("status", ASCENDING), ("lease_expires_at", ASCENDING), ("created_at", ASCENDING)])
+
+
+# =====================================================
+# Producer side
+# =====================================================
+def submit_job(job_id: str, **fields) -> dict:
+    """Register a freshly submitted ADE job for the poller to watch."""
+    now = datetime.utcnow()
+    _jobs().update_one(
+        {"job_id": job_id},
+        {
+            "$set": {"status": STATUS_PENDING, "updated_at": now, **fields},
+            "$setOnInsert": {"job_id": job_id, "attempts": 0, "created_at": now},
+        },
+        upsert=True,
+    )
+    return {"status": STATUS_PENDING, "job_id": job_id}
+
+
+def pending_job_ids() -> list:
+    """Job IDs still waiting on ADE, oldest first."""
+    cursor = _jobs().find({"status": STATUS_PENDING}, {"job_id": 1}).sort("created_at", ASCENDING)
+    return [d["job_id"] for d in cursor]
+
+
+def dispatch_job(job_id: str, **fields) -> bool:
+    """Move a pending job into the ingest queue once ADE has finished parsing it."""
+    result = _jobs().update_one(
+        {"job_id": job_id, "status": STATUS_PENDING},
+        {"$set": {"status": STATUS_QUEUED, "updated_at": datetime.utcnow(), **fields}},
+    )
+    return result.matched_count == 1
+
+
+def reject_pending_job(job_id: str, error: str) -> bool:
+    """Mark a pending job `failed` when ADE reports the parse itself failed."""
+    result = _jobs().update_one(
+        {"job_id": job_id, "status": STATUS_PENDING},
+        {"$set": {"status": STATUS_FAILED, "error": error, "updated_at": datetime.utcnow()}},
+    )
+    return result.matched_count == 1
+
+
+def enqueue_job(job_id: str, **fields) -> dict:
+    """Add (or re-queue) an ADE job for the ingest workers."""
+    now = datetime.utcnow()
+    _jobs().update_one(
+        {"job_id": job_id},
+        {
+            "$set": {"status": STATUS_QUEUED, "updated_at": now, **fields},
+            "$setOnInsert": {"job_id": job_id, "attempts": 0, "created_at": now},
+        },
+        upsert=True,
+    )
+    return {"status": STATUS_QUEUED, "job_id": job_id}
+
+
+def record_cached_job(job_id: str, **fields) -> dict:
+    """Record an upload that was fully served from the document cache (nothing to run)."""
+    now = datetime.utcnow()
+    _jobs().insert_one({
+        "job_id": job_id, "status": STATUS_COMPLETED, "attempts": 0,
+        "created_at": now, "updated_at": now, **fields,
+    })
+    return {"status": STATUS_COMPLETED, "job_id": job_id}
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    return _jobs().find_one({"job_id": job_id})
+
+
+def find_active_job(content_hash: str) -> Optional[dict]:
+    """An unfinished job for the same file contents, so concurrent re-uploads share it."""
+    return _jobs().find_one({
+        "content_hash": content_hash,
+        "status": {"$in": [STATUS_PENDING, STATUS_QUEUED, STATUS_RUNNING]},
+    })
+
+
+def queue_depth() -> dict:
+    """Count jobs per state for the pending / queued / running / error buckets."""
+    return {
+        state: _jobs().count_documents({"status": state})
+        for state in (STATUS_PENDING, STATUS_QUEUED, STATUS_RUNNING, STATUS_ERROR)
+    }
+
+
+# =====================================================
+# Worker side
+# =====================================================
+def claim_job(worker_id: str, lease_seconds: int = LEASE_SECONDS) -> Optional[dict]:
+    """
+    Atomically claim the oldest queued job, or a running job whose lease expired.
+    Returns the claimed job document, or None when the queue is empty.
+    """
+    now = datetime.utcnow()
+    return _jobs().find_one_and_update(
+        {
+            "$or": [
+                {"status": STATUS_QUEUED},
+                {"status": STATUS_RUNNING, "lease_expires_at": {"$lt": now}},
+            ]
+        },
+        {
+            "$set": {
+                "status": STATUS_RUNNING,
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                "heartbeat_at": now,
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def heartbeat(job_id: str, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> bool:
+    """Extend the lease on a job. Returns False if this worker no longer owns it."""
+    now = datetime.utcnow()
+    result = _jobs().update_one(
+        {"job_id": job_id, "status": STATUS_RUNNING, "lease_owner": worker_id},
+        {"$set": {"lease_expires_at": now + timedelta(seconds=lease_seconds), "heartbeat_at": now}},
+    )
+    return result.matched_count == 1
+
+
+def _finish(job_id: str, worker_id: str, update: dict) -> bool:
+    update.setdefault("$set", {})["updated_at"] = datetime.utcnow()
+    update.setdefault("$unset", {}).update({"lease_owner": "", "lease_expires_at": ""})
+    result = _jobs().update_one(
+        {"job_id": job_id, "status": STATUS_RUNNING, "lease_owner": worker_id},
+        update,
+    )
+    return result.matched_count == 1
+
+
+def complete_job(job_id: str, worker_id: str, **fields) -> bool:
+    return _finish(job_id, worker_id, {"$set": {"status": STATUS_COMPLETED, "error": None, **fields}})
+
+
+def fail_job(job_id: str, worker_id: str, error: str, attempts: int, max_attempts: int = MAX_ATTEMPTS) -> bool:
+    """Re-queue a failed job, or park it in `error` once it has used all its attempts."""
+    status = STATUS_QUEUED if attempts < max_attempts else STATUS_ERROR
+    return _finish(job_id, worker_id, {"$set": {"status": status, "error": error}})
+
+
+def reject_job(job_id: str, worker_id: str, error: str) -> bool:
+    """Mark a job as permanently `failed` (e.g. ADE itself rejected the document)."""
+    return _finish(job_id, worker_id, {"$set": {"status": STATUS_FAILED, "error": error}})
+
+
+def defer_job(job_id: str, worker_id: str) -> bool:
+    """Send a job back to `pending` when ADE turns out not to be finished with it yet."""
+    return _finish(job_id, worker_id, {"$set": {"status": STATUS_PENDING}, "$inc": {"attempts": -1}})
+
+
+def release_job(job_id: str, worker_id: str) -> bool:
+    """Hand a job back to the queue without counting the attempt (graceful shutdown)."""
+    return _finish(job_id, worker_id, {"$set": {"status": STATUS_QUEUED}, "$inc": {"attempts": -1}})
@@ -0,0 +1,112 @@
+"""
+LLM providers
+-------------
+One interface for the chat models behind synthesize_answer, selected with
+LLM_PROVIDER:
+
+    openai    OpenAI chat completions (LLM_MODEL, default gpt-4o-mini)
+    bedrock   AWS Bedrock Converse API via a pooled boto3 client
+              (BEDROCK_MODEL_ID; see services/bedrock_client.py)
+
+Every provider takes OpenAI-style messages ([{"role", "content"}, ...]) and
+offers complete() (blocking), stream() (yields text pieces) and the
+awaitable acomplete().
+
+LLM_MAX_TOKENS caps the answer length. Unset, OpenAI answers are not
+capped (the model's own limit applies); Bedrock's Converse API needs a cap
+and falls back to BEDROCK_MAX_TOKENS.
+"""
+import asyncio
+import os
+from typing import Dict, Iterator, List, Optional
+
+from services.resources import register
+
+# =====================================================
+# Configuration
+# =====================================================
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS")) if os.getenv("LLM_MAX_TOKENS") else None
+
+
+class LLMProvider:
+    name = "base"
+
+    def complete(self, messages: List[Dict], temperature: float = 0.2, max_tokens: Optional[int] = LLM_MAX_TOKENS) -> str:
+        raise NotImplementedError
+
+    def stream(self, messages: List[Dict], temperature: float = 0.2, max_tokens: Optional[int] = LLM_MAX_TOKENS) -> Iterator[str]:
+        raise NotImplementedError
+
+    async def acomplete(self, messages: List[Dict], temperature: float = 0.2, max_tokens: Optional[int] = LLM_MAX_TOKENS) -> str:
+        # Blocking SDKs run in a worker thread; providers with a native async client override this
+        return await asyncio.to_thread(self.complete, messages, temperature, max_tokens)
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        self.close()
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, model: str = None):
+        from openai import AsyncOpenAI, OpenAI
+
+        # Both read OPENAI_API_KEY from env and keep their own connection pools
+        self.model = model or os.getenv("LLM_MODEL", "gpt-4o-mini")
+        self.client = OpenAI()
+        self.async_client = AsyncOpenAI()
+
+    def _params(self, messages, temperature, max_tokens) -> dict:
+        params = {"model": self.model, "messages": messages, "temperature": temperature}
+        # No cap unless one is asked for
+        if max_tokens is not None:
+            params["max_tokens"] = max_tokens
+        return params
+
+    def complete(self, messages, temperature=0.2, max_tokens=LLM_MAX_TOKENS):
+        response = self.client.chat.completions.create(**self._params(messages, temperature, max_tokens))
+        return response.choices[0].message.content.strip()
+
+    def stream(self, messages, temperature=0.2, max_tokens=LLM_MAX_TOKENS):
+        stream = self.client.chat.completions.create(**self._params(messages, temperature, max_tokens), stream=True)
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def acomplete(self, messages, temperature=0.2, max_tokens=LLM_MAX_TOKENS):
+        response = await self.async_client.chat.completions.create(**self._params(messages, temperature, max_tokens))
+        return response.choices[0].message.content.strip()
+
+    def close(self):
+        self.client.close()
+
+    async def aclose(self):
+        self.client.close()
+        await self.async_client.close()
+
+
+def _load_provider() -> LLMProvider:
+    # Read at first use, after the agent has loaded .env
+    provider = os.getenv("LLM_PROVIDER", "openai").lower()
+    if provider == "openai":
+        return OpenAIProvider()
+    if provider == "bedrock":
+        from services.bedrock_client import BedrockProvider
+        return BedrockProvider()
+    raise ValueError(f"Unknown LLM_PROVIDER: {provider!r} (expected 'openai' or 'bedrock')")
+
+
+_provider = register("llm", _load_provider)
+
+
+def get_llm_provider() -> LLMProvider:
+    return _provider.get()
+
+
+async def close_llm_provider():
+    if _provider.initialized:
+        await _provider.get().aclose()
+    _provider.close()
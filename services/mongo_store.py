@@ -2,6 +2,7 @@ from pymongo import MongoClient
 import os
 from datetime import datetime
 import re
+from services.resources import register
 
 # =====================================================
 # MongoDB Setup
@@ -9,8 +10,17 @@ import re
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/")
 DB_NAME = os.getenv("MONGO_DB_NAME", "agent_finance_db")
 
-client = MongoClient(MONGO_URL)
-db = client[DB_NAME]
+# Connected on first use; call get_db() rather than holding the database at import time
+_mongo = register("mongo", lambda: MongoClient(MONGO_URL), closer=lambda c: c.close())
+
+
+def get_db():
+    return _mongo.get()[DB_NAME]
+
+
+def ping():
+    """Cheap round-trip used by the readiness warm-up."""
+    _mongo.get().admin.command("ping")
 
 # =====================================================
 # Utility Functions
@@ -29,7 +39,7 @@ def normalize_company_name(name: str) -> str:
 # =====================================================
 def save_document(document: dict, collection: str = "documents"):
     """Generic save for any ADE or RAG document."""
-    collection_ref = db[collection]
+    collection_ref = get_db()[collection]
     if not document:
         return {"status": "error", "message": "Empty document data"}
     document["created_at"] = datetime.utcnow()
@@ -47,7 +57,7 @@ def save_schema_document(schema_data: dict):
         return {"status": "error", "message": "Missing company_name in schema_data"}
 
     company = normalize_company_name(schema_data["company_name"])
-    collection = db["financial_schemas"]
+    collection = get_db()["financial_schemas"]
 
     schema_data["_company_key"] = company
     schema_data["created_at"] = datetime.utcnow()
@@ -60,6 +70,7 @@ def save_schema_document(schema_data: dict):
         collection.insert_one(schema_data)
         msg = "inserted"
 
+    bump_company_version(company)
     return {"status": msg, "company": company}
 
 
@@ -68,7 +79,7 @@ def save_text_chunks(chunks: list, company: str):
     Save RAG text chunks (from Markdown / embeddings preprocessing).
     """
     company_key = normalize_company_name(company)
-    collection = db["document_chunks"]
+    collection = get_db()["document_chunks"]
 
     if not chunks:
         return {"status": "error", "message": "No chunks to save"}
@@ -89,6 +100,29 @@ def save_text_chunks(chunks: list, company: str):
     return {"status": "success", "count": len(records)}
 
 
+def bump_company_version(company: str):
+    """Record that a company's data changed; answer caches keyed on the old version stop matching."""
+    get_db()["company_versions"].update_one(
+        {"_id": normalize_company_name(company)},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+def get_company_version(company: str) -> int:
+    record = get_db()["company_versions"].find_one({"_id": normalize_company_name(company)}, {"version": 1})
+    return record["version"] if record else 0
+
+
+def save_service_stats(service: str, stats: dict):
+    """Publish a background service's counters so the API can report them."""
+    get_db()["service_stats"].update_one(
+        {"_id": service},
+        {"$set": {**stats, "updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
 # =====================================================
 # Retrieval Functions
 # =====================================================
@@ -101,17 +135,23 @@ def get_documents_by_company(company: str, mode: str = "chunks"):
     company_key = normalize_company_name(company)
 
     if mode == "schema":
-        record = db["financial_schemas"].find_one({"_company_key": company_key})
+        record = get_db()["financial_schemas"].find_one({"_company_key": company_key})
         return record or {}
 
     elif mode == "chunks":
-        docs = list(db["document_chunks"].find({"_company_key": company_key}))
+        docs = list(get_db()["document_chunks"].find({"_company_key": company_key}))
         return docs
 
     else:
         return []
 
 
+def get_service_stats(service: str) -> dict:
+    """Latest counters published by a background service (see save_service_stats)."""
+    record = get_db()["service_stats"].find_one({"_id": service}, {"_id": 0})
+    return record or {}
+
+
 def get_all_companies():
     """List all company names stored in schemas."""
-    return [d["_company_key"] for d in db["financial_schemas"].find({}, {"_company_key": 1})]
+    return [d["_company_key"] for d in get_db()["financial_schemas"].find({}, {"_company_key": 1})]
@@ -41,6 +41,8 @@
 import re
 from tqdm import tqdm
 
+from services.chunker import StructuredChunker
+
 def clean_text(text: str) -> str:
     """Clean text from unwanted spaces, artifacts, or HTML."""
     text = re.sub(r"<[^>]+>", " ", text)  # remove HTML tags
@@ -70,6 +72,10 @@ def preprocess_ade_json(ade_json):
     """
     all_texts = []
 
+    # Real ADE output: chunk its structured `chunks` directly
+    if isinstance(ade_json, dict) and ade_json.get("chunks"):
+        return list(StructuredChunker().iter_chunks(ade_json["chunks"]))
+
     # Handle both dict and list formats
     if isinstance(ade_json, dict):
         if "pages" in ade_json:
@@ -105,3 +111,12 @@ def preprocess_ade_json(ade_json):
             all_chunks.append({"text": chunk, "metadata": {"source": "ADE"}})
 
     return all_chunks
+
+
+def iter_ade_chunks(ade_chunks, company_name: str = None):
+    """
+    Lazily turn ADE `chunks` items into embedding-sized text chunks.
+    Accepts any iterable (e.g. an incremental JSON reader), so the whole
+    ADE output never has to be in memory at once.
+    """
+    return StructuredChunker().iter_chunks(ade_chunks, company_name)
@@ -0,0 +1,196 @@
+"""
+Qdrant collection schema
+------------------------
+Declares what `financial_chunks` should look like — vector params, HNSW
+settings, optional quantization and the payload indexes every filtered
+search relies on — and applies it idempotently:
+
+- a missing collection is created with the full schema
+- missing payload indexes are created; HNSW / quantization differences are
+  updated in place
+- differences that cannot be changed in place (vector size / distance, the
+  BM25 sparse vector, an index with the wrong type) are only reported as drift
+
+Run `python -m services.qdrant_schema` to print drift, `--apply` to fix it.
+
+Quantization (QDRANT_QUANTIZATION=none|scalar|binary) keeps the compressed
+vectors in RAM; searches oversample with the quantized vectors and rescore
+the candidates with the originals (see search_params()).
+"""
+import argparse
+import json
+import logging
+import os
+from typing import List
+
+from qdrant_client import QdrantClient, models
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+VECTOR_SIZE = 384
+VECTOR_DISTANCE = models.Distance.COSINE
+HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+# Extra per-company graph links, so filtered searches inside one tenant stay connected
+HNSW_PAYLOAD_M = int(os.getenv("QDRANT_HNSW_PAYLOAD_M", "16"))
+QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QUANTIZATION_RESCORE = os.getenv("QDRANT_QUANTIZATION_RESCORE", "1") == "1"
+QUANTIZATION_OVERSAMPLING = float(os.getenv("QDRANT_QUANTIZATION_OVERSAMPLING", "2.0"))
+SEARCH_HNSW_EF = int(os.getenv("QDRANT_SEARCH_HNSW_EF", "0"))  # 0 = server default
+# Named BM25 sparse vector next to the (unnamed) dense one, for hybrid retrieval
+SPARSE_VECTORS = os.getenv("QDRANT_SPARSE_VECTORS", "1") == "1"
+SPARSE_VECTOR_NAME = "bm25"
+
+# CompanyName is the tenant key: every retrieval filters on it
+PAYLOAD_INDEXES = {
+    "CompanyName": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True),
+    "type": models.PayloadSchemaType.KEYWORD,
+    "source": models.PayloadSchemaType.KEYWORD,
+    "doc_id": models.PayloadSchemaType.KEYWORD,
+    "page": models.PayloadSchemaType.INTEGER,
+}
+
+
+def _schema_type(schema) -> str:
+    # A PayloadSchemaType, or *IndexParams carrying the type enum in `.type`
+    kind = getattr(schema, "type", schema)
+    return getattr(kind, "value", kind)
+
+
+def vectors_config() -> models.VectorParams:
+    return models.VectorParams(size=VECTOR_SIZE, distance=VECTOR_DISTANCE)
+
+
+def sparse_vectors_config():
+    if not SPARSE_VECTORS:
+        return None
+    # Qdrant applies the IDF half of BM25 server-side, from live collection statistics
+    return {SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)}
+
+
+def has_sparse_vectors(client: QdrantClient, collection_name: str) -> bool:
+    sparse = client.get_collection(collection_name).config.params.sparse_vectors or {}
+    return SPARSE_VECTOR_NAME in sparse
+
+
+def hnsw_config() -> models.HnswConfigDiff:
+    return models.HnswConfigDiff(m=HNSW_M, ef_construct=HNSW_EF_CONSTRUCT, payload_m=HNSW_PAYLOAD_M)
+
+
+def quantization_config():
+    if QUANTIZATION == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if QUANTIZATION == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    if QUANTIZATION != "none":
+        raise ValueError(f"Unknown QDRANT_QUANTIZATION: {QUANTIZATION!r} (expected none, scalar or binary)")
+    return None
+
+
+def search_params() -> models.SearchParams:
+    """Query-time params matching the collection: rescore quantized candidates with full vectors."""
+    quantization = None
+    if QUANTIZATION != "none":
+        quantization = models.QuantizationSearchParams(
+            rescore=QUANTIZATION_RESCORE, oversampling=QUANTIZATION_OVERSAMPLING
+        )
+    return models.SearchParams(hnsw_ef=SEARCH_HNSW_EF or None, quantization=quantization)
+
+
+def _quantization_kind(config) -> str:
+    if isinstance(config, models.ScalarQuantization):
+        return "scalar"
+    if isinstance(config, models.BinaryQuantization):
+        return "binary"
+    if isinstance(config, models.ProductQuantization):
+        return "product"
+    return "none"
+
+
+def schema_drift(client: QdrantClient, collection_name: str) -> List[dict]:
+    """Every difference between the live collection and the declared schema."""
+    if not client.collection_exists(collection_name):
+        return [{"field": "collection", "expected": collection_name, "actual": None, "fixable": True}]
+
+    info = client.get_collection(collection_name)
+    drift = []
+
+    def check(field, expected, actual, fixable):
+        if expected != actual:
+            drift.append({"field": field, "expected": expected, "actual": actual, "fixable": fixable})
+
+    vectors = info.config.params.vectors
+    if isinstance(vectors, models.VectorParams):
+        check("vectors.size", VECTOR_SIZE, vectors.size, False)
+        check("vectors.distance", VECTOR_DISTANCE.value, vectors.distance.value, False)
+    # Sparse vectors cannot be added to an existing collection; re-create and re-ingest to enable them
+    sparse = info.config.params.sparse_vectors or {}
+    check(f"sparse_vectors.{SPARSE_VECTOR_NAME}", SPARSE_VECTORS, SPARSE_VECTOR_NAME in sparse, False)
+
+    hnsw = info.config.hnsw_config
+    check("hnsw.m", HNSW_M, hnsw.m, True)
+    check("hnsw.ef_construct", HNSW_EF_CONSTRUCT, hnsw.ef_construct, True)
+    check("hnsw.payload_m", HNSW_PAYLOAD_M, hnsw.payload_m or hnsw.m, True)
+    check("quantization", QUANTIZATION, _quantization_kind(info.config.quantization_config), True)
+
+    live_indexes = info.payload_schema or {}
+    for field, schema in PAYLOAD_INDEXES.items():
+        expected = _schema_type(schema)
+        actual = live_indexes.get(field)
+        check(f"payload_index.{field}", expected, _schema_type(actual.data_type) if actual else None, actual is None)
+    return drift
+
+
+def ensure_collection(client: QdrantClient, collection_name: str) -> List[dict]:
+    """Create or converge the collection to the declared schema; returns the drift that remains."""
+    if not client.collection_exists(collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=vectors_config(),
+            sparse_vectors_config=sparse_vectors_config(),
+            hnsw_config=hnsw_config(),
+            quantization_config=quantization_config(),
+        )
+        logger.info(f"Created Qdrant collection {collection_name} (quantization={QUANTIZATION}).")
+
+    drift = schema_drift(client, collection_name)
+    fields = {d["field"] for d in drift if d["fixable"]}
+
+    if fields & {"hnsw.m", "hnsw.ef_construct", "hnsw.payload_m"}:
+        client.update_collection(collection_name=collection_name, hnsw_config=hnsw_config())
+    if "quantization" in fields:
+        client.update_collection(
+            collection_name=collection_name,
+            quantization_config=quantization_config() or models.Disabled.DISABLED,
+        )
+    for field, schema in PAYLOAD_INDEXES.items():
+        if f"payload_index.{field}" in fields:
+            client.create_payload_index(collection_name=collection_name, field_name=field, field_schema=schema)
+            logger.info(f"Created payload index {collection_name}.{field}.")
+
+    remaining = schema_drift(client, collection_name) if fields else drift
+    for d in remaining:
+        logger.warning(f"Qdrant schema drift on {collection_name}: {d}")
+    return remaining
+
+
+def main():
+    from services.vector_store import COLLECTION_NAME, QDRANT_URL
+
+    parser = argparse.ArgumentParser(description="Report (and optionally fix) Qdrant collection schema drift")
+    parser.add_argument("--apply", action="store_true", help="create / update the collection to match")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    client = QdrantClient(url=QDRANT_URL)
+    drift = ensure_collection(client, COLLECTION_NAME) if args.apply else schema_drift(client, COLLECTION_NAME)
+    print(json.dumps(drift, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Cross-encoder reranking
+-----------------------
+Optional second retrieval stage: over-fetch RERANK_CANDIDATES chunks from
+Qdrant, rescore every (query, chunk) pair with a small local cross-encoder
+in one batched CPU forward pass, and keep the RERANK_TOP_N best that score
+at least RERANK_MIN_SCORE. Fewer, better chunks mean a shorter prompt for
+synthesize_answer.
+
+Pair scores are cached by (query hash, chunk id), so a repeated question
+only runs the model for chunks it has not scored before.
+"""
+import hashlib
+import logging
+import os
+import time
+from typing import Dict, List, Tuple
+
+from services.embedding_cache import normalize_text
+from services.lru_cache import TTLCache
+from services.resources import register
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "5"))
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "-inf"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "50000"))
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", "3600"))
+
+
+def _load_model():
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(RERANK_MODEL, max_length=512, device="cpu")
+
+
+_model = register("reranker", _load_model)
+_score_cache = TTLCache(maxsize=RERANK_CACHE_SIZE, ttl=RERANK_CACHE_TTL)
+
+
+def _query_key(query: str) -> str:
+    return hashlib.sha256(normalize_text(query).lower().encode("utf-8")).hexdigest()[:32]
+
+
+def _chunk_key(doc: dict) -> str:
+    # Point IDs are deterministic per chunk; fall back to the text itself
+    return doc.get("id") or hashlib.sha256(doc["text"].encode("utf-8")).hexdigest()
+
+
+def score(query: str, docs: List[dict]) -> Tuple[List[float], int]:
+    """Cross-encoder scores for each doc (cached pairs reused); returns (scores, pairs run through the model)."""
+    qkey = _query_key(query)
+    keys = [(qkey, _chunk_key(d)) for d in docs]
+    scores = [_score_cache.get(k) for k in keys]
+
+    missing = [i for i, s in enumerate(scores) if s is None]
+    if missing:
+        fresh = _model.get().predict(
+            [(query, docs[i]["text"]) for i in missing], batch_size=RERANK_BATCH_SIZE, show_progress_bar=False
+        )
+        for i, s in zip(missing, fresh):
+            scores[i] = float(s)
+            _score_cache.put(keys[i], scores[i])
+    return scores, len(missing)
+
+
+def rerank(query: str, docs: List[dict], top_n: int = RERANK_TOP_N, min_score: float = RERANK_MIN_SCORE) -> Tuple[List[dict], Dict]:
+    """Return the top_n docs by cross-encoder score (each gains `rerank_score`) and stage timings."""
+    started = time.perf_counter()
+    if not docs:
+        return [], {"rerank_ms": 0.0, "candidates": 0, "scored": 0, "kept": 0}
+
+    scores, scored = score(query, docs)
+    ranked = sorted(zip(scores, range(len(docs))), reverse=True)
+    kept = [{**docs[i], "rerank_score": round(s, 4)} for s, i in ranked if s >= min_score][:top_n]
+
+    stats = {
+        "rerank_ms": round((time.perf_counter() - started) * 1000, 2),
+        "candidates": len(docs),
+        "scored": scored,
+        "kept": len(kept),
+    }
+    logger.info(f"Rerank: {stats}")
+    return kept, stats
+
+
+def rerank_cache_stats() -> dict:
+    return _score_cache.stats()
@@ -0,0 +1,116 @@
+"""
+Lazy resource registry
+----------------------
+Process-wide clients (embedding model, Qdrant, Mongo, LLM) are registered
+here instead of being built at import time. Each one is created on first
+use, exactly once even under concurrent requests, so importing the app is
+cheap and an unavailable backend fails the request that needs it rather
+than the import.
+
+The FastAPI lifespan in main.py calls warm_up() to build the heavy
+resources ahead of traffic and close_all() on shutdown; /health/ready
+reports ready() so orchestrators only route to warmed workers.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LazyResource:
+    def __init__(self, name: str, factory: Callable[[], Any], closer: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self._factory = factory
+        self._closer = closer
+        self._value = None
+        self._initialized = False
+        self._lock = threading.Lock()
+        self.init_seconds = None
+
+    @property
+    def initialized(self) -> bool:
+        return self._initialized
+
+    def get(self):
+        if self._initialized:
+            return self._value
+        with self._lock:
+            if not self._initialized:
+                started = time.perf_counter()
+                self._value = self._factory()
+                self.init_seconds = round(time.perf_counter() - started, 3)
+                self._initialized = True
+                logger.info(f"Initialized {self.name} in {self.init_seconds}s.")
+        return self._value
+
+    def close(self):
+        with self._lock:
+            if self._initialized and self._closer is not None:
+                try:
+                    self._closer(self._value)
+                except Exception as e:
+                    logger.warning(f"Closing {self.name} failed: {e}")
+            self._value = None
+            self._initialized = False
+
+
+_registry: Dict[str, LazyResource] = {}
+_registry_lock = threading.Lock()
+_state = {"ready": False, "warming": False, "error": None, "warmup_seconds": None}
+
+
+def register(name: str, factory: Callable[[], Any], closer: Optional[Callable[[Any], None]] = None) -> LazyResource:
+    """Register (or return the already registered) lazy resource `name`."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LazyResource(name, factory, closer)
+        return _registry[name]
+
+
+def get(name: str):
+    return _registry[name].get()
+
+
+def warm_up(checks: Dict[str, Callable[[], Any]]):
+    """
+    Run the named warm-up checks in order (blocking; call from a thread).
+    The process is marked ready only if every check passes.
+    """
+    _state.update(ready=False, warming=True, error=None)
+    started = time.perf_counter()
+    try:
+        for name, check in checks.items():
+            step = time.perf_counter()
+            check()
+            logger.info(f"Warm-up: {name} ok in {time.perf_counter() - step:.2f}s.")
+    except Exception as e:
+        _state["error"] = f"{name}: {e}"
+        logger.exception(f"Warm-up failed at {name}")
+        raise
+    else:
+        _state["ready"] = True
+    finally:
+        _state["warming"] = False
+        _state["warmup_seconds"] = round(time.perf_counter() - started, 3)
+
+
+def ready() -> bool:
+    return _state["ready"]
+
+
+def status() -> dict:
+    return {
+        **_state,
+        "resources": {
+            name: {"initialized": r.initialized, "init_seconds": r.init_seconds}
+            for name, r in _registry.items()
+        },
+    }
+
+
+def close_all():
+    _state["ready"] = False
+    for resource in list(_registry.values()):
+        resource.close()
@@ -0,0 +1,75 @@
+"""
+BM25 sparse encoder
+-------------------
+Lexical vectors for hybrid retrieval. Financial questions hinge on exact
+tokens ("FY 2025", "EBITDA", line-item names, tickers) that dense MiniLM
+vectors blur; a sparse BM25 vector per chunk catches them.
+
+Documents get BM25-saturated term frequencies; the IDF half of BM25 is
+applied by Qdrant (the sparse vector is declared with Modifier.IDF), so it
+stays correct as the collection grows. Queries are plain term-presence
+vectors. Token IDs are a stable 32-bit hash, so no vocabulary is stored.
+"""
+import os
+import re
+import zlib
+from collections import Counter
+from typing import List
+
+from qdrant_client import models
+
+# =====================================================
+# Configuration
+# =====================================================
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+BM25_AVG_DOC_LEN = float(os.getenv("BM25_AVG_DOC_LEN", "120"))
+
+# Keeps "fy2025", "2,345.6", "q4" and "ebitda" as single tokens
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have how in is it its of on or that the this to "
+    "was were what which will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        # "2,345.6" and "2345.6" should match
+        tokens.append(token.replace(",", "") if token[0].isdigit() else token)
+    return tokens
+
+
+def token_id(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _to_sparse(weights: dict) -> models.SparseVector:
+    indices = sorted(weights)
+    return models.SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+
+def _weights(tokens: List[str], tf_weight) -> dict:
+    weights = {}
+    for token, tf in Counter(tokens).items():
+        idx = token_id(token)
+        # crc32 collisions are rare; sum rather than drop
+        weights[idx] = weights.get(idx, 0.0) + tf_weight(tf)
+    return weights
+
+
+def encode_document(text: str) -> models.SparseVector:
+    tokens = tokenize(text)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_DOC_LEN)
+    return _to_sparse(_weights(tokens, lambda tf: tf * (BM25_K1 + 1) / (tf + norm)))
+
+
+def encode_query(text: str) -> models.SparseVector:
+    return _to_sparse(_weights(tokenize(text), lambda tf: 1.0))
+
+
+def encode_documents(texts: List[str]) -> List[models.SparseVector]:
+    return [encode_document(t) for t in texts]
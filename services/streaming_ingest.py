@@ -0,0 +1,162 @@
+"""
+Streaming ADE ingestion
+-----------------------
+parse → chunk → embed → upsert as a pipeline of generators and bounded
+queues, so peak memory stays flat however large the ADE output is.
+
+    reader thread   : ADE file → `chunks` items (incremental JSON) → text chunks → batches
+    embedder thread : batch → embed_chunks
+    caller thread   : embedded batch → chunk_store (Qdrant upsert)
+
+The first batches are searchable in Qdrant while the rest of the file is
+still being read. Enable it in the ingest worker with INGEST_STREAMING=1.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+
+from services.preprocessor import iter_ade_chunks
+from services.embedder import embed_chunks
+from services.vector_store import chunk_store, prune_document_points
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional dependency
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# Configuration
+# =====================================================
+STREAM_BATCH_SIZE = int(os.getenv("INGEST_STREAM_BATCH_SIZE", "64"))
+STREAM_QUEUE_DEPTH = int(os.getenv("INGEST_STREAM_QUEUE_DEPTH", "4"))
+
+_DONE = object()
+
+
+# =====================================================
+# Incremental ADE JSON reading
+# =====================================================
+def iter_ade_items(path: str) -> Iterator[dict]:
+    """Yield the ADE `chunks` array one item at a time."""
+    with open(path, "rb") as f:
+        if ijson is None:
+            logger.warning("ijson not installed; loading the whole ADE output to iterate its chunks.")
+            yield from json.load(f).get("chunks", [])
+            return
+        yield from ijson.items(f, "chunks.item", use_float=True)
+
+
+def read_ade_field(path: str, key: str, default=None):
+    """Read one top-level field (e.g. `markdown`, `extraction`) without materialising `chunks`."""
+    with open(path, "rb") as f:
+        if ijson is None:
+            return json.load(f).get(key, default)
+        for value in ijson.items(f, key, use_float=True):
+            return value
+    return default
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+# =====================================================
+# Pipeline
+# =====================================================
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _consume(q: queue.Queue, stop: threading.Event) -> Iterator:
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        yield item
+
+
+def _stage(source: Iterable, sink: queue.Queue, fn, stop: threading.Event, errors: list):
+    """Apply `fn` to every item from `source` and push the results into the bounded `sink`."""
+    try:
+        for item in source:
+            if not _put(sink, fn(item), stop):
+                return
+        _put(sink, _DONE, stop)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+
+
+def _tap(items: Iterable[dict], on_item: Callable[[dict], None]) -> Iterator[dict]:
+    for item in items:
+        on_item(item)
+        yield item
+
+
+def stream_ingest_ade_file(path: str, company_name: str = None, doc_id: str = None,
+                           batch_size: int = STREAM_BATCH_SIZE,
+                           queue_depth: int = STREAM_QUEUE_DEPTH,
+                           on_item: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Chunk, embed and upsert an ADE output file batch by batch with bounded memory.
+    `on_item` sees every raw ADE item as it is read (in the reader thread).
+    """
+    errors = []
+    stop = threading.Event()
+    chunked = queue.Queue(maxsize=queue_depth)
+    embedded = queue.Queue(maxsize=queue_depth)
+
+    items = iter_ade_items(path)
+    if on_item is not None:
+        items = _tap(items, on_item)
+    batches = batched(iter_ade_chunks(items, company_name), batch_size)
+    threads = [
+        threading.Thread(target=_stage, args=(batches, chunked, list, stop, errors), daemon=True),
+        threading.Thread(target=_stage, args=(_consume(chunked, stop), embedded, embed_chunks, stop, errors), daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    stored = 0
+    n_batches = 0
+    point_ids = set()
+    try:
+        for batch in _consume(embedded, stop):
+            # Pruning per batch would delete the batches before it
+            stored += chunk_store(batch, doc_id=doc_id, prune=False, point_ids=point_ids).get("stored", 0)
+            n_batches += 1
+    except Exception as e:
+        errors.append(e)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+    # Only once the whole document is in: a failed ingest keeps the previous version searchable
+    if doc_id and point_ids:
+        prune_document_points(doc_id, point_ids)
+
+    logger.info(f"Streamed {stored} chunks from {path} in {n_batches} batches.")
+    return {"stored": stored, "batches": n_batches}
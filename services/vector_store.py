@@ -1,45 +1,173 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, PointStruct
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client import models
+from qdrant_client.models import PointStruct
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import os
+import time
 import uuid
+from typing import Iterable, Optional
+from services.mongo_store import bump_company_version
+from services.qdrant_schema import SPARSE_VECTOR_NAME, ensure_collection, has_sparse_vectors, search_params
+from services.sparse_encoder import encode_document, encode_query
+from services.resources import register
 
-client = QdrantClient(url="http://localhost:6333")
-COLLECTION_NAME = "financial_chunks"
+logger = logging.getLogger(__name__)
+
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "financial_chunks")
+
+# Upsert tuning
+UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+UPSERT_PARALLELISM = int(os.getenv("QDRANT_UPSERT_PARALLELISM", "4"))
+UPSERT_MAX_RETRIES = int(os.getenv("QDRANT_UPSERT_MAX_RETRIES", "3"))
+UPSERT_BACKOFF_BASE = float(os.getenv("QDRANT_UPSERT_BACKOFF_BASE", "0.5"))
+POINT_ID_NAMESPACE = uuid.UUID("6f1d2c9e-4b7a-5e8f-9a3c-1d2e3f4a5b6c")
+
+# Retrieval: "hybrid" fuses dense + BM25 sparse results with RRF (falls back to dense
+# on collections created without the sparse vector); "dense" is cosine only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+HYBRID_PREFETCH_LIMIT = int(os.getenv("HYBRID_PREFETCH_LIMIT", "20"))
+
+def _init_collection(client):
+    # Creates the collection or converges it (payload indexes, HNSW, quantization); drift is logged
+    ensure_collection(client, COLLECTION_NAME)
+
+def _connect():
+    client = QdrantClient(url=QDRANT_URL)
+    _init_collection(client)
+    return client
+
+# One client per process, shared by ingestion and retrieval; connected on first use
+_qdrant = register("qdrant", _connect, closer=lambda c: c.close())
+
+
+def get_qdrant_client() -> QdrantClient:
+    return _qdrant.get()
+
+
+# Whether the live collection carries the BM25 sparse vector; checked once per process
+_sparse = register("qdrant_sparse", lambda: has_sparse_vectors(get_qdrant_client(), COLLECTION_NAME))
+
+
+def sparse_enabled() -> bool:
+    return _sparse.get()
+
+
+# Async client for the query path; the collection itself is ensured by the sync client
+_qdrant_async = register("qdrant_async", lambda: AsyncQdrantClient(url=QDRANT_URL))
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    return _qdrant_async.get()
+
+
+async def close_async_qdrant_client():
+    if _qdrant_async.initialized:
+        await _qdrant_async.get().close()
+    _qdrant_async.close()
+
+
+def ping():
+    """Cheap round-trip used by the readiness warm-up; also settles the hybrid-search capability check."""
+    get_qdrant_client().get_collection(COLLECTION_NAME)
+    sparse_enabled()
+
+
+def point_id(doc_id: str, chunk_index: int, text: str) -> str:
+    """Stable point ID: the same chunk of the same document always maps to the same point."""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{doc_id}:{chunk_index}:{text_hash}"))
 
-def _init_collection():
-    collections = [c.name for c in client.get_collections().collections]
-    if COLLECTION_NAME not in collections:
-        client.create_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(size=384, distance="Cosine")
-        )
 
-_init_collection()
+def _upsert_batch(client, points, wait: bool):
+    for attempt in range(UPSERT_MAX_RETRIES + 1):
+        try:
+            return client.upsert(collection_name=COLLECTION_NAME, points=points, wait=wait)
+        except Exception as e:
+            # IDs are deterministic, so resending a batch that partly landed is harmless
+            if attempt == UPSERT_MAX_RETRIES:
+                raise
+            delay = UPSERT_BACKOFF_BASE * (2 ** attempt)
+            logger.warning(f"Qdrant upsert of {len(points)} points failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
 
 
-def chunk_store(chunks):
+def upsert_points(points, batch_size: int = UPSERT_BATCH_SIZE, parallelism: int = UPSERT_PARALLELISM) -> int:
+    """
+    Upload points in batches, in parallel and without waiting for indexing,
+    then send the last batch with wait=True as a consistency barrier: Qdrant
+    applies a collection's updates in order, so once it returns, every earlier
+    batch is applied too.
+    """
+    if not points:
+        return 0
+    client = get_qdrant_client()
+    batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
+    *head, barrier = batches
+    if head:
+        with ThreadPoolExecutor(max_workers=min(parallelism, len(head))) as pool:
+            # list() surfaces the first batch that still failed after its retries
+            list(pool.map(lambda b: _upsert_batch(client, b, wait=False), head))
+    _upsert_batch(client, barrier, wait=True)
+    return len(points)
+
+
+def prune_document_points(doc_id: str, keep_ids: Iterable[str]):
+    """Delete `doc_id`'s points that are not in `keep_ids`: leftovers of an earlier ingest of the document."""
+    get_qdrant_client().delete(
+        collection_name=COLLECTION_NAME,
+        points_selector=models.FilterSelector(
+            filter=models.Filter(
+                must=[models.FieldCondition(key="doc_id", match=models.MatchValue(value=doc_id))],
+                must_not=[models.HasIdCondition(has_id=list(keep_ids))],
+            )
+        ),
+        wait=True,
+    )
+
+
+def chunk_store(chunks, doc_id: str = None, prune: bool = True, point_ids: Optional[set] = None):
     """
     Store embedded chunks into Qdrant with correct payload keys for LangChain.
+    Point IDs derive from `doc_id` (the document's content hash) and each chunk,
+    so re-ingesting a document overwrites its points instead of duplicating them;
+    with `prune`, its points that the new chunking no longer produces are deleted.
+    Callers storing one document in several batches pass prune=False and a
+    `point_ids` set to collect into, then call prune_document_points once.
     """
     points = []
+    with_sparse = sparse_enabled()
     for ch in chunks:
         text = ch.get("text") or ch.get("content") or ""
         if not text.strip():
             continue
 
-        metadata = ch.get("extraction", {})
-        company = metadata.get("company_name" or metadata.get("CompanyName"))
+        metadata = ch.get("metadata") or ch.get("extraction") or {}
+        company = metadata.get("CompanyName") or metadata.get("company_name")
+        chunk_index = metadata.get("chunk_index", 0)
+        source = metadata.get("source", "ADE")
+        vector = ch["embedding"]
+        if with_sparse:
+            # "" is the unnamed dense vector; the BM25 vector rides alongside it
+            vector = {"": vector, SPARSE_VECTOR_NAME: encode_document(text)}
 
         points.append(
             PointStruct(
-                id=str(uuid.uuid4()),
-                vector=ch["embedding"],
+                id=point_id(doc_id or f"{company}:{source}", chunk_index, text),
+                vector=vector,
                 payload={
                     "page_content": text,       # ✅ Required for LangChain
                     "CompanyName": company,     # For company-based filters
-                    "source": metadata.get("source", "ADE"),
-                    "chunk_index": metadata.get("chunk_index", 0),
+                    "source": source,
+                    "doc_id": doc_id,
+                    "chunk_index": chunk_index,
                     "page": metadata.get("page", 0),
-                    "type": metadata.get("type", "text")
+                    "type": metadata.get("type", "text"),
+                    "pages": metadata.get("pages", []),
+                    "chunk_ids": metadata.get("chunk_ids", []),
+                    "grounding": metadata.get("grounding", []),
                 },
             )
         )
@@ -48,6 +176,69 @@ def chunk_store(chunks):
         print("⚠️ No valid chunks to store in Qdrant.")
         return {"stored": 0}
 
-    client.upsert(collection_name=COLLECTION_NAME, points=points)
+    upsert_points(points)
+    if point_ids is not None:
+        point_ids.update(p.id for p in points)
+    # After the wait=True barrier, so the new points are live before the old ones go
+    if prune and doc_id:
+        prune_document_points(doc_id, [p.id for p in points])
+    # New data for these companies: cached answers about them are stale everywhere
+    for company in {p.payload["CompanyName"] for p in points if p.payload["CompanyName"]}:
+        bump_company_version(company)
     print(f"✅ Stored {len(points)} chunks in Qdrant.")
     return {"stored": len(points)}
+
+
+def company_filter(company_name: str) -> models.Filter:
+    return models.Filter(
+        must=[models.FieldCondition(key="CompanyName", match=models.MatchValue(value=company_name))]
+    )
+
+
+def _search_request(query: str, query_vector, company_name: str, limit: int, mode: str = None) -> dict:
+    query_filter = company_filter(company_name)
+    mode = mode or RETRIEVAL_MODE
+
+    if mode == "hybrid" and sparse_enabled():
+        prefetch_limit = max(limit, HYBRID_PREFETCH_LIMIT)
+        return dict(
+            collection_name=COLLECTION_NAME,
+            prefetch=[
+                models.Prefetch(query=query_vector, limit=prefetch_limit, filter=query_filter, params=search_params()),
+                models.Prefetch(
+                    query=encode_query(query), using=SPARSE_VECTOR_NAME, limit=prefetch_limit, filter=query_filter
+                ),
+            ],
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=limit,
+            with_payload=True,
+        )
+    return dict(
+        collection_name=COLLECTION_NAME,
+        query=query_vector,
+        limit=limit,
+        with_payload=True,
+        search_params=search_params(),
+        query_filter=query_filter,
+    )
+
+
+def fused_scores(mode: str = None) -> bool:
+    """Whether searches in `mode` return RRF-fused scores (rank-based) rather than cosine similarities."""
+    return (mode or RETRIEVAL_MODE) == "hybrid" and sparse_enabled()
+
+
+def search_chunks(query: str, query_vector, company_name: str, limit: int = 5, mode: str = None):
+    """
+    Top `limit` chunks of one company for the query. In hybrid mode the dense
+    and BM25 searches run together server-side and are fused with reciprocal
+    rank fusion.
+    """
+    request = _search_request(query, query_vector, company_name, limit, mode)
+    return get_qdrant_client().query_points(**request).points
+
+
+async def search_chunks_async(query: str, query_vector, company_name: str, limit: int = 5, mode: str = None):
+    """search_chunks on the async client, for the async query pipeline."""
+    request = _search_request(query, query_vector, company_name, limit, mode)
+    return (await get_async_qdrant_client().query_points(**request)).points